@@ -31,6 +31,20 @@ class Settings(BaseSettings):
     # Пути
     recordings_path: str = "/var/spool/asterisk/recording"
     
+    # Транскрипция записей после звонка
+    recording_workers: int = 2  # звонков одновременно (по два запроса на звонок)
+    recording_settle_seconds: float = 5.0  # файл не менялся столько — MixMonitor его закрыл
+    recording_watcher_enabled: bool = True  # False — только полный просмотр каталога при старте
+    recording_cursor_path: str = "/app/data/recordings_cursor.json"
+    
+    # Кэш транскрипции по содержимому аудио
+    transcript_cache_enabled: bool = True
+    transcript_cache_path: str = "/app/data/transcript_cache"
+    transcript_cache_max_mb: int = 512
+    # Живые чанки почти не повторяются: хэш и запись на диск на каждом чанке
+    # без попаданий вытесняют записи звонков. Включать для IVR с повторами
+    transcript_cache_pcm: bool = False
+    
     # Сервер
     api_host: str = "0.0.0.0"
     api_port: int = 8000
@@ -40,9 +54,89 @@ class Settings(BaseSettings):
     llm_model: str = "anthropic/claude-3.5-sonnet"  # или "openai/gpt-4o-mini"
     llm_temperature: float = 0.3
     
+    # HTTP клиент OpenRouter (один на процесс, keep-alive)
+    llm_http2: bool = True
+    llm_max_connections: int = 20
+    llm_keepalive_connections: int = 10
+    llm_keepalive_expiry: float = 120.0  # сек простоя до закрытия соединения
+    llm_connect_timeout: float = 3.0
+    llm_read_timeout: float = 20.0
+    llm_write_timeout: float = 5.0
+    llm_pool_timeout: float = 2.0  # ожидание свободного соединения
+    # Подсказки: сегменты, пришедшие подряд, склеиваются в один запрос
+    llm_suggest_debounce_ms: int = 300  # пауза после последнего сегмента
+    llm_suggest_max_delay_ms: int = 1500  # но не дольше от первого
+    # Реплика клиента отменяет запрос моложе этого окна (не больше N отмен подряд)
+    llm_supersede_window_ms: int = 1500
+    llm_max_superseded: int = 2
+    llm_max_tokens: int = 300
+    
+    # Кэш подсказок LLM: компания + нормализованная реплика + стадия разговора
+    suggestion_cache_enabled: bool = True
+    suggestion_cache_ttl_seconds: float = 3600.0
+    suggestion_cache_max_entries: int = 10000
+    suggestion_cache_similarity: float = 0.0  # > 0 — искать похожую реплику (косинус триграмм)
+    
+    # Подсказки по правилам (возражения) до LLM; переопределяются в Company.settings
+    objection_rules_enabled: bool = True
+    objection_skip_llm: bool = False  # не спрашивать LLM, если сработало уверенное правило
+    objection_skip_llm_confidence: float = 0.9
+    objection_rule_cooldown_seconds: float = 60.0  # правило срабатывает раз в N секунд
+    
     # STT настройки
     soniox_model: str = "ru"  # Русская модель
     soniox_sample_rate: int = 16000
+    # streaming — постоянный поток Soniox на сторону звонка; batch — чанки по endpointing
+    stt_mode: str = "streaming"
+    stt_stream_endpoint_padding_ms: int = 500  # тишина в поток после конца речи (VAD)
+    soniox_pool_size: int = 2  # gRPC каналов на все звонки
+    # Лимиты STT (лимиты компании переопределяются в Company.settings)
+    stt_max_concurrent: int = 32  # одновременных запросов транскрипции чанков
+    stt_company_max_concurrent: int = 8
+    stt_max_streams: int = 200  # потоковых сессий (по две на звонок)
+    stt_company_max_streams: int = 40
+    
+    # Границы чанков (по умолчанию; переопределяются в Company.settings)
+    stt_min_chunk_seconds: float = 0.5
+    stt_max_chunk_seconds: float = 8.0
+    stt_endpoint_silence_ms: int = 300
+    
+    # Звук звонка в реальном времени: snoop сторон → ExternalMedia → прием RTP.
+    # Выключено — транскрибируются только записи MixMonitor после звонка
+    realtime_media_enabled: bool = False
+    media_external_host: str = "127.0.0.1"  # адрес приемника RTP для Asterisk
+    
+    # Формат ExternalMedia: slin16 | slin | ulaw | alaw | auto (нативный G.711 канала)
+    external_media_format: str = "auto"
+    
+    # Прием RTP: 0 — в event loop API, N — N процессов-воркеров
+    media_ingest_workers: int = 0
+    media_ingest_reuseport: bool = False  # один порт на всех воркеров вместо диапазона
+    media_ingest_batch_size: int = 64  # датаграмм за одно чтение сокета
+    
+    # DSP (decode → resample → VAD): 0 — в event loop, N — пул из N процессов
+    dsp_workers: int = 0
+    dsp_slots_per_worker: int = 64  # одновременных запросов на воркер
+    dsp_slot_kb: int = 64  # размер входного слота разделяемой памяти
+    
+    # VAD: в STT отправляется только речь
+    vad_enabled: bool = True
+    vad_model: str = ""  # внешняя модель "package.module:factory", по умолчанию энергия + ZCR
+    
+    # Шумоподавление (спектральное вычитание) и АРУ перед STT; переопределяются
+    # в Company.settings ключами noise_suppression и agc
+    noise_suppression_enabled: bool = False
+    agc_enabled: bool = False
+    
+    # Музыка ожидания и автоответчик: сторона не транскрибируется, подсказки не запрашиваются
+    line_classifier_enabled: bool = True
+    machine_detection_enabled: bool = True  # только клиент в исходящих звонках
+    
+    # Аудио буферы
+    audio_buffer_seconds: float = 12.0  # бюджет одной стороны звонка (не меньше stt_max_chunk_seconds)
+    audio_global_budget_mb: float = 512.0  # общий бюджет буферов и очередей потоков Soniox всех звонков
+    # drop_oldest — перезаписывать старое аудио; pause — не принимать новое, пока STT не разберет буфер
+    audio_budget_policy: str = "drop_oldest"
     
     class Config:
         env_file = ".env"
@@ -14,7 +14,15 @@ from loguru import logger
 from .config import get_settings
 from .schemas.events import Call, CallEvent, Suggestion
 from .services.call_manager import call_manager
-from .services.asterisk_ari import ari_service, audio_receiver
+from .services.ai_agent import ai_agent
+from .services.asterisk_ari import ari_service
+from .services.media_ingest import media_receiver
+from .services.dsp_pool import dsp_pool
+from .services.soniox_pool import soniox_pool
+from .services.stt_scheduler import stt_scheduler
+from .services.recording_transcriber import recording_transcriber
+from .services.recording_watcher import recording_watcher
+from .services.transcript_cache import transcript_cache
 from .api import auth, admin, calls
 from .database import Base, engine
 from .admin_panel import setup_admin
@@ -67,8 +75,24 @@ async def lifespan(app: FastAPI):
     # Подписываем WebSocket manager на события звонков
     call_manager.subscribe(ws_manager.broadcast)
     
-    # Запускаем audio receiver (для real-time)
-    # await audio_receiver.start()
+    # Прием RTP сторон звонка (snoop → ExternalMedia)
+    if settings.realtime_media_enabled:
+        await media_receiver.start()
+    if dsp_pool is not None:
+        await dsp_pool.start()
+    
+    # Общий пул каналов Soniox
+    await soniox_pool.start()
+    
+    # Соединения с OpenRouter переиспользуются между подсказками
+    await ai_agent.start()
+    
+    # Транскрипция записей MixMonitor после звонков
+    await recording_transcriber.start()
+    if settings.recording_watcher_enabled:
+        await recording_watcher.start()
+    else:
+        await recording_transcriber.scan()
     
     # Подключаемся к Asterisk ARI
     # async def handle_ari_event(event):
@@ -82,7 +106,14 @@ async def lifespan(app: FastAPI):
     # Cleanup
     logger.info("Shutting down...")
     call_manager.unsubscribe(ws_manager.broadcast)
-    # await audio_receiver.stop()
+    if settings.realtime_media_enabled:
+        await media_receiver.stop()
+    if dsp_pool is not None:
+        await dsp_pool.stop()
+    await recording_watcher.stop()
+    await recording_transcriber.stop()
+    await soniox_pool.stop()
+    await ai_agent.close()
     # await ari_service.close()
 
 
@@ -136,7 +167,15 @@ async def health_check():
         "status": "healthy",
         "asterisk": settings.asterisk_host,
         "active_calls": len(call_manager.active_calls),
-        "ws_connections": len(ws_manager.active_connections)
+        "ws_connections": len(ws_manager.active_connections),
+        "audio": call_manager.get_audio_stats(),
+        "soniox": soniox_pool.get_stats(),
+        "stt": stt_scheduler.get_stats(),
+        "recordings": recording_transcriber.get_stats(),
+        "recordings_watcher": recording_watcher.get_stats(),
+        "transcript_cache": transcript_cache.get_stats() if transcript_cache else None,
+        "llm": ai_agent.get_stats(),
+        "suggestions": call_manager.get_suggestion_stats()
     }
 
 
@@ -227,7 +266,6 @@ async def demo_start_call():
 async def _demo_call_flow(call_id: str):
     """Эмулирует поток звонка для демо"""
     from .schemas.events import TranscriptSegment, CallDirection
-    from .services.ai_agent import ai_agent
     
     await asyncio.sleep(2)
     await call_manager.handle_call_answer(call_id)
@@ -14,6 +14,7 @@ class CallSession(Base):
     company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
     trunk_id = Column(Integer, ForeignKey("sip_trunks.id", ondelete="SET NULL"), nullable=True)
+    call_id = Column(String(64), unique=True, index=True, nullable=True)  # UNIQUEID Asterisk (имя записи MixMonitor)
     
     # Call details
     direction = Column(String(20))  # 'inbound', 'outbound'
@@ -1,6 +1,6 @@
 """Модели данных"""
 from pydantic import BaseModel
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -36,6 +36,22 @@ class TranscriptSegment(BaseModel):
     speaker: Literal["operator", "client"]
     text: str
     confidence: float = 1.0
+    segment_id: Optional[str] = None  # у потоковой транскрипции финал заменяет partial с тем же id
+
+
+class TranscriptPartial(BaseModel):
+    """
+    Промежуточный текст сегмента: только изменение относительно предыдущей версии.
+    append — токены дописываются в конец; replace — первые keep токенов остаются,
+    остальные заменяются на tokens
+    """
+    call_id: str
+    segment_id: str
+    timestamp: float
+    speaker: Literal["operator", "client"]
+    op: Literal["append", "replace"]
+    keep: int
+    tokens: List[str]
 
 
 class Suggestion(BaseModel):
@@ -45,11 +61,27 @@ class Suggestion(BaseModel):
     title: str
     content: str
     priority: Literal["low", "medium", "high"] = "medium"
+    source: Literal["llm", "rules"] = "llm"  # rules — мгновенная подсказка по правилам компании
+    # Потоковый ответ LLM: предварительная подсказка (provisional) дополняется
+    # событиями suggestion_delta и заменяется итоговой с тем же suggestion_id
+    suggestion_id: Optional[str] = None
+    provisional: bool = False
     created_at: datetime = datetime.now()
 
 
+class SuggestionDelta(BaseModel):
+    """Продолжение content предварительной подсказки; cancelled — подсказку убрать"""
+    call_id: str
+    suggestion_id: str
+    delta: str = ""
+    cancelled: bool = False
+
+
 class CallEvent(BaseModel):
     """Событие звонка для WebSocket"""
-    event_type: Literal["call_start", "call_answer", "call_end", "transcript", "suggestion"]
+    event_type: Literal[
+        "call_start", "call_answer", "call_end", "transcript", "transcript_partial",
+        "suggestion", "suggestion_delta", "speech_start", "speech_end", "on_hold", "machine_detected", "live_speech"
+    ]
     call_id: str
     data: dict
@@ -1,10 +1,15 @@
 """AI Agent для генерации подсказок через OpenRouter"""
+import asyncio
 import json
-from typing import Optional, List
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Optional, List
 import httpx
 from loguru import logger
 from ..config import get_settings
 from ..schemas.events import Suggestion, TranscriptSegment
+from .suggestion_cache import MISS, SuggestionCache, suggestion_cache
+from .suggestion_stream import FIELD, SuggestionStreamParser
 from datetime import datetime
 
 settings = get_settings()
@@ -53,14 +58,214 @@ SYSTEM_PROMPT = """Ты — AI-ассистент для операторов к
 """
 
 
-class AIAgentService:
-    """AI агент для анализа разговоров через OpenRouter"""
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными границами корзин (мс)"""
+    
+    BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        
+    def percentile(self, q: float) -> Optional[float]:
+        """Верхняя граница корзины, в которую попадает перцентиль"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+        
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50_le_ms": self.percentile(0.5),
+            "p95_le_ms": self.percentile(0.95),
+            "buckets": {
+                f"le_{bound}": count for bound, count in zip(self.BOUNDS_MS + ("inf",), self.counts)
+            },
+        }
+
+
+class _RequestTrace:
+    """Отметки времени фаз запроса из trace-событий httpcore"""
     
     def __init__(self):
+        self.started = time.perf_counter()
+        self.events: Dict[str, float] = {}
+        # От начала запроса до первого токена и до предварительной подсказки
+        self.first_token: Optional[float] = None
+        self.provisional: Optional[float] = None
+        
+    async def __call__(self, name: str, info: dict):
+        self.events.setdefault(name, time.perf_counter())
+        
+    @property
+    def connect(self) -> Optional[float]:
+        """Установка нового соединения (DNS, TCP, TLS); None — соединение из пула"""
+        started = self.events.get("connection.connect_tcp.started")
+        if started is None:
+            return None
+        finished = self.events.get("connection.start_tls.complete") or self.events.get("connection.connect_tcp.complete")
+        return finished - started if finished else None
+        
+    @property
+    def first_byte(self) -> Optional[float]:
+        for name in ("http2.receive_response_headers.complete", "http11.receive_response_headers.complete"):
+            if name in self.events:
+                return self.events[name] - self.started
+        return None
+
+
+class AIAgentService:
+    """
+    AI агент для анализа разговоров через OpenRouter.
+    HTTP клиент (HTTP/2, keep-alive) живет столько же, сколько приложение:
+    открывается в start(), закрывается в close() из lifespan
+    """
+    
+    def __init__(self, cache: Optional[SuggestionCache] = suggestion_cache):
+        self.cache = cache
         self.api_key = settings.openrouter_api_key
         self.base_url = settings.openrouter_base_url
         self.model = settings.llm_model
         self.conversation_history: dict[str, List[TranscriptSegment]] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        self.latency = {
+            "connect": LatencyHistogram(),
+            "first_byte": LatencyHistogram(),
+            "first_token": LatencyHistogram(),
+            "provisional": LatencyHistogram(),  # type и title известны — подсказка на экране
+            "total": LatencyHistogram(),
+        }
+        self._suggestion_seq = 0
+        self.requests = 0
+        self.reused_connections = 0
+        self.errors = 0
+        self.cancelled = 0  # отменены новой репликой: в гистограммы не попадают
+        
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=settings.llm_http2,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "HTTP-Referer": "https://ai-call-agent.local",  # Required by OpenRouter
+                "X-Title": "AI Call Agent",  # Required by OpenRouter
+            },
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.llm_connect_timeout,
+                read=settings.llm_read_timeout,
+                write=settings.llm_write_timeout,
+                pool=settings.llm_pool_timeout
+            )
+        )
+        
+    async def start(self):
+        """Открывает HTTP клиент"""
+        if self._client is None:
+            self._client = self._create_client()
+            logger.info(f"OpenRouter client started (http2={settings.llm_http2})")
+            
+    async def close(self):
+        """Закрывает соединения"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Вне lifespan (скрипты, тесты) клиент создается при первом запросе
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+        
+    async def _stream(
+        self,
+        path: str,
+        payload: dict,
+        trace: "_RequestTrace",
+        on_text: Callable[[str], Awaitable[None]]
+    ) -> httpx.Response:
+        """
+        POST с потоковым ответом (SSE): текст ответа модели передается в on_text
+        по мере генерации. Замеряются соединение, первый байт, первый токен и весь ответ
+        """
+        self.requests += 1
+        cancelled = False
+        try:
+            async with self.client.stream(
+                "POST", path, json={**payload, "stream": True}, extensions={"trace": trace}
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    return response
+                async for line in response.aiter_lines():
+                    # Комментарии SSE (": OPENROUTER PROCESSING") и пустые строки пропускаются
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        raise RuntimeError(f"OpenRouter stream error: {chunk['error']}")
+                    choices = chunk.get("choices") or []
+                    text = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if text:
+                        if trace.first_token is None:
+                            trace.first_token = time.perf_counter() - trace.started
+                        await on_text(text)
+                return response
+        except asyncio.CancelledError:
+            cancelled = True
+            self.cancelled += 1
+            raise
+        finally:
+            # Задержки — только завершенных и неудачных запросов
+            if not cancelled:
+                self._record(trace)
+            
+    def _record(self, trace: "_RequestTrace"):
+        self.latency["total"].observe(time.perf_counter() - trace.started)
+        connect = trace.connect
+        if connect is None:
+            self.reused_connections += 1
+        else:
+            self.latency["connect"].observe(connect)
+        if trace.first_byte is not None:
+            self.latency["first_byte"].observe(trace.first_byte)
+        if trace.first_token is not None:
+            self.latency["first_token"].observe(trace.first_token)
+        if trace.provisional is not None:
+            self.latency["provisional"].observe(trace.provisional)
+        
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "reused_connections": self.reused_connections,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "cache": self.cache.get_stats() if self.cache else None,
+            "latency": {phase: histogram.get_stats() for phase, histogram in self.latency.items()},
+        }
         
     def add_transcript(self, segment: TranscriptSegment):
         """Добавляет сегмент транскрипции в историю"""
@@ -88,67 +293,137 @@ class AIAgentService:
         
         # Добавляем в историю
         self.add_transcript(new_segment)
+        return await self.suggest(call_id, [new_segment])
+    
+    async def suggest(
+        self,
+        call_id: str,
+        new_segments: List[TranscriptSegment],
+        company_id: Optional[int] = None,
+        on_provisional: Optional[Callable[[Suggestion], Awaitable[None]]] = None,
+        on_delta: Optional[Callable[[str, str], Awaitable[None]]] = None
+    ) -> Optional[Suggestion]:
+        """
+        Подсказка по новым репликам (кэш или потоковый запрос к LLM).
+        on_provisional — как только известны type и title, on_delta дописывает content
+        """
         
         # Получаем контекст
         context = self.get_conversation_context(call_id)
         
-        if not context:
+        if not context or not new_segments:
             return None
+        
+        self._suggestion_seq += 1
+        suggestion_id = f"{call_id}:s{self._suggestion_seq}"
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                company_id, new_segments, len(self.conversation_history.get(call_id, []))
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not MISS:
+                return self._build_suggestion(call_id, cached, suggestion_id) if cached else None
+        
+        if len(new_segments) == 1:
+            segment = new_segments[0]
+            latest = f"Последняя реплика от {'оператора' if segment.speaker == 'operator' else 'клиента'}: \"{segment.text}\""
+        else:
+            latest = "Последние реплики:\n" + "\n".join(
+                f"{'ОПЕРАТОР' if seg.speaker == 'operator' else 'КЛИЕНТ'}: {seg.text}" for seg in new_segments
+            )
+        
+        trace = _RequestTrace()
+        parser = SuggestionStreamParser()
+        fields: Dict[str, str] = {}
+        content: List[str] = []
+        provisional = False
+        
+        async def on_text(text: str):
+            nonlocal provisional
+            for kind, key, value in parser.feed(text):
+                if kind == FIELD:
+                    fields[key] = value
+                elif key == "content":
+                    content.append(value)
+                    if provisional and on_delta is not None:
+                        await on_delta(suggestion_id, value)
+                if not provisional and on_provisional is not None and "type" in fields and "title" in fields:
+                    provisional = True
+                    try:
+                        early = self._build_suggestion(
+                            call_id, {**fields, "content": "".join(content)}, suggestion_id, provisional=True
+                        )
+                    except ValueError as e:
+                        logger.warning(f"Provisional suggestion is invalid: {e}")
+                        continue
+                    trace.provisional = time.perf_counter() - trace.started
+                    await on_provisional(early)
             
         try:
-            # Формируем запрос к OpenRouter
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://ai-call-agent.local",  # Required by OpenRouter
-                        "X-Title": "AI Call Agent",  # Required by OpenRouter
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": SYSTEM_PROMPT},
-                            {
-                                "role": "user", 
-                                "content": f"Текущий разговор:\n\n{context}\n\nПоследняя реплика от {'оператора' if new_segment.speaker == 'operator' else 'клиента'}: \"{new_segment.text}\"\n\nНужна ли подсказка оператору?"
-                            }
-                        ],
-                        "temperature": settings.llm_temperature,
-                        "max_tokens": 300,
-                        "response_format": {"type": "json_object"}
-                    }
-                )
+            # Формируем запрос к OpenRouter (соединение берется из пула клиента)
+            response = await self._stream(
+                "/chat/completions",
+                {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {
+                            "role": "user", 
+                            "content": f"Текущий разговор:\n\n{context}\n\n{latest}\n\nНужна ли подсказка оператору?"
+                        }
+                    ],
+                    "temperature": settings.llm_temperature,
+                    "max_tokens": settings.llm_max_tokens,
+                    "response_format": {"type": "json_object"}
+                },
+                trace,
+                on_text
+            )
             
             if response.status_code != 200:
+                self.errors += 1
                 logger.error(f"OpenRouter API error: {response.status_code} - {response.text}")
                 return None
             
-            result_data = response.json()
-            result = result_data["choices"][0]["message"]["content"]
+            result = parser.payload
             
+            data = None
             if result and result.strip() != "null":
-                data = json.loads(result)
-                if data:
-                    return Suggestion(
-                        call_id=call_id,
-                        type=data.get("type", "info"),
-                        title=data.get("title", "Подсказка"),
-                        content=data.get("content", ""),
-                        priority=data.get("priority", "medium"),
-                        created_at=datetime.now()
-                    )
+                data = json.loads(result) or None
+            suggestion = self._build_suggestion(call_id, data, suggestion_id) if data else None
+            if cache_key is not None:
+                self.cache.put(cache_key, suggestion.model_dump(
+                    include={"type", "title", "content", "priority"}
+                ) if suggestion else None)
+            return suggestion
                     
         except json.JSONDecodeError as e:
             logger.warning(f"JSON parse error: {e}")
-        except httpx.TimeoutException:
-            logger.error("OpenRouter request timeout")
+        except httpx.TimeoutException as e:
+            self.errors += 1
+            logger.error(f"OpenRouter request timeout ({type(e).__name__})")
         except Exception as e:
+            self.errors += 1
             logger.error(f"AI analysis error: {e}")
             
         return None
     
+    def _build_suggestion(
+        self, call_id: str, data: dict, suggestion_id: Optional[str] = None, provisional: bool = False
+    ) -> Suggestion:
+        return Suggestion(
+            call_id=call_id,
+            type=data.get("type", "info"),
+            title=data.get("title", "Подсказка"),
+            content=data.get("content", ""),
+            priority=data.get("priority", "medium"),
+            suggestion_id=suggestion_id,
+            provisional=provisional,
+            created_at=datetime.now()
+        )
+    
     def clear_call(self, call_id: str):
         """Очищает историю звонка"""
         if call_id in self.conversation_history:
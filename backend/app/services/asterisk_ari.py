@@ -1,12 +1,18 @@
 """Интеграция с Asterisk ARI"""
 import asyncio
+import inspect
 import aiohttp
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional
 from loguru import logger
 from ..config import get_settings
+from .audio_codec import G711_CODECS, get_codec
+from .rtp import RTP_HEADER_SIZE, Address, JitterBuffer, RTPDemux, StreamKey, parse_rtp
 
 settings = get_settings()
 
+# Счетчики jitter buffer, которые складываются по воркерам приема
+_SUMMED_STATS = ("received", "lost", "late", "duplicates", "reordered", "concealed")
+
 
 class AsteriskARIService:
     """Сервис для работы с Asterisk через ARI"""
@@ -29,6 +35,8 @@ class AsteriskARIService:
             async with session.request(method, url, **kwargs) as response:
                 if response.status == 200:
                     return await response.json()
+                elif response.status == 204:
+                    return {}
                 else:
                     text = await response.text()
                     logger.error(f"ARI error: {response.status} - {text}")
@@ -64,18 +72,44 @@ class AsteriskARIService:
             params=params
         )
     
+    async def get_native_format(self, channel_id: str) -> Optional[str]:
+        """Нативный аудиоформат канала (то, что пришло с транка)"""
+        result = await self._make_request(
+            "GET",
+            f"channels/{channel_id}/variable",
+            params={"variable": "CHANNEL(audionativeformat)"}
+        )
+        # Значение вида "(ulaw)" или "(ulaw|alaw)"
+        formats = result.get("value", "").strip("()").split("|")
+        return formats[0] or None
+    
+    async def choose_media_format(self, channel_id: str) -> str:
+        """
+        Самый дешевый формат ExternalMedia для канала.
+        G.711 с транка пересылается без транскодирования, остальное — slin16
+        """
+        if settings.external_media_format != "auto":
+            return settings.external_media_format
+        native = await self.get_native_format(channel_id)
+        return native if native in G711_CODECS else "slin16"
+    
     async def start_external_media(
         self,
         channel_id: str,
-        external_host: str = "127.0.0.1:8001"
+        external_host: str = "127.0.0.1:8001",
+        media_format: Optional[str] = None
     ) -> dict:
         """
-        Создает канал ExternalMedia для получения RTP потока
+        Создает канал ExternalMedia для получения RTP потока.
+        Без media_format формат выбирается через choose_media_format
         """
+        if media_format is None:
+            media_format = await self.choose_media_format(channel_id)
+        get_codec(media_format)  # ValueError для неподдерживаемых форматов
         params = {
             "app": self.app_name,
             "external_host": external_host,
-            "format": "slin16",  # 16-bit signed linear, хорошо для STT
+            "format": media_format,
         }
         return await self._make_request(
             "POST",
@@ -83,6 +117,62 @@ class AsteriskARIService:
             params=params
         )
     
+    async def start_leg_media(
+        self,
+        channel_id: str,
+        spy: str,
+        external_host: str,
+        media_format: str
+    ) -> dict:
+        """
+        RTP одной стороны канала: snoop (spy = in | out) и ExternalMedia в общем мосте.
+        Возвращает {"snoop", "channel", "bridge"}; при ошибке созданное удаляется
+        """
+        leg = {}
+        try:
+            snoop = await self.snoop_channel(channel_id, spy=spy)
+            if not snoop:
+                raise RuntimeError(f"snoop {spy} on {channel_id} failed")
+            leg["snoop"] = snoop["id"]
+            channel = await self.start_external_media(channel_id, external_host, media_format)
+            if not channel:
+                raise RuntimeError(f"externalMedia for {channel_id} failed")
+            leg["channel"] = channel
+            bridge = await self._make_request("POST", "bridges", params={"type": "mixing"})
+            if not bridge:
+                raise RuntimeError(f"bridge for {channel_id} failed")
+            leg["bridge"] = bridge["id"]
+            await self._make_request(
+                "POST",
+                f"bridges/{bridge['id']}/addChannel",
+                params={"channel": f"{snoop['id']},{channel['id']}"}
+            )
+        except Exception:
+            await self.stop_leg_media(leg)
+            raise
+        return leg
+    
+    async def stop_leg_media(self, leg: dict):
+        """Кладет каналы стороны и удаляет мост"""
+        for channel_id in (leg.get("snoop"), (leg.get("channel") or {}).get("id")):
+            if channel_id:
+                await self._make_request("DELETE", f"channels/{channel_id}")
+        if leg.get("bridge"):
+            await self._make_request("DELETE", f"bridges/{leg['bridge']}")
+    
+    @staticmethod
+    def get_external_media_address(channel: dict) -> Optional[Address]:
+        """
+        Адрес, с которого Asterisk отправляет RTP ExternalMedia канала.
+        Нужен AudioStreamReceiver для привязки потока к звонку
+        """
+        variables = channel.get("channelvars") or {}
+        host = variables.get("UNICASTRTP_LOCAL_ADDRESS")
+        port = variables.get("UNICASTRTP_LOCAL_PORT")
+        if not host or not port or host == "0.0.0.0":
+            return None
+        return host, int(port)
+    
     async def subscribe_events(self, callback: Callable):
         """Подписывается на события ARI через WebSocket"""
         
@@ -112,14 +202,52 @@ class AsteriskARIService:
             self._ws_task.cancel()
 
 
+class AudioStream:
+    """Аудиопоток одной стороны звонка с собственной очередью пакетов"""
+    
+    def __init__(
+        self,
+        call_id: str,
+        speaker: str,
+        callback: Callable,
+        queue_size: int,
+        jitter_buffer: Optional[JitterBuffer] = None
+    ):
+        self.call_id = call_id
+        self.speaker = speaker
+        self.callback = callback
+        # None, если jitter buffer работает в процессе-воркере приема
+        self.jitter_buffer = jitter_buffer
+        self.remote_stats: Dict[int, dict] = {}  # воркер приема → счетчики его jitter buffer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped_packets = 0
+        self.task: Optional[asyncio.Task] = None
+        
+    def get_stats(self) -> dict:
+        """Счетчики jitter buffer потока"""
+        if self.jitter_buffer is not None:
+            return self.jitter_buffer.get_stats()
+        # С SO_REUSEPORT поток зарегистрирован во всех воркерах: пустые не учитываются,
+        # jitter и глубина — воркера, принявшего больше всего пакетов
+        active = [stats for stats in self.remote_stats.values() if stats.get("received")]
+        if not active:
+            return {}
+        merged = dict(max(active, key=lambda stats: stats["received"]))
+        for key in _SUMMED_STATS:
+            merged[key] = sum(stats.get(key, 0) for stats in active)
+        return merged
+
+
 class AudioStreamReceiver:
     """Приемник аудиопотока через UDP"""
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 8001):
+    def __init__(self, host: str = "0.0.0.0", port: int = 8001, queue_size: int = 250):
         self.host = host
         self.port = port
+        self.queue_size = queue_size  # ~5 секунд при пакетах по 20 мс
         self.transport = None
-        self.audio_callbacks: dict[str, Callable] = {}
+        self.streams: dict[StreamKey, AudioStream] = {}
+        self.demux = RTPDemux()
         
     async def start(self):
         """Запускает UDP сервер для приема RTP"""
@@ -131,11 +259,8 @@ class AudioStreamReceiver:
                 
             def datagram_received(self, data, addr):
                 # RTP header is 12 bytes
-                if len(data) > 12:
-                    payload = data[12:]  # Skip RTP header
-                    # Вызываем все зарегистрированные callbacks
-                    for callback in self.receiver.audio_callbacks.values():
-                        asyncio.create_task(callback(payload))
+                if len(data) > RTP_HEADER_SIZE:
+                    self.receiver.dispatch(data, addr)
         
         self.transport, _ = await loop.create_datagram_endpoint(
             lambda: AudioProtocol(self),
@@ -143,17 +268,109 @@ class AudioStreamReceiver:
         )
         logger.info(f"Audio receiver started on {self.host}:{self.port}")
         
-    def register_callback(self, call_id: str, callback: Callable):
-        """Регистрирует callback для обработки аудио"""
-        self.audio_callbacks[call_id] = callback
+    def dispatch(self, data: bytes, addr: Address):
+        """Кладет пакет в jitter buffer ровно одного потока"""
+        packet = parse_rtp(data)
+        if packet is None:
+            return
+        
+        key = self.demux.resolve(packet.ssrc, addr)
+        stream = self.streams.get(key) if key else None
+        if stream is None:
+            return
+        
+        for payload in stream.jitter_buffer.push(packet):
+            try:
+                stream.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                stream.dropped_packets += 1
         
-    def unregister_callback(self, call_id: str):
-        """Удаляет callback"""
-        if call_id in self.audio_callbacks:
-            del self.audio_callbacks[call_id]
+    def register_stream(
+        self,
+        call_id: str,
+        speaker: str,
+        callback: Callable,
+        remote_addr: Optional[Address] = None,
+        ssrc: Optional[int] = None,
+        media_format: str = "slin16"
+    ) -> AudioStream:
+        """
+        Регистрирует поток стороны звонка.
+        remote_addr — адрес из get_external_media_address(), если известен.
+        callback получает упорядоченный payload всех пакетов, накопившихся в очереди
+        """
+        key = (call_id, speaker)
+        if key in self.streams:
+            self.unregister_stream(call_id, speaker)
+        
+        codec = get_codec(media_format)
+        jitter_buffer = JitterBuffer(
+            clock_rate=codec.sample_rate,
+            bytes_per_sample=codec.bytes_per_sample,
+            silence_byte=codec.silence_byte
+        )
+        stream = AudioStream(call_id, speaker, callback, self.queue_size, jitter_buffer)
+        self.streams[key] = stream
+        self.demux.register(key, remote_addr=remote_addr, ssrc=ssrc)
+        stream.task = asyncio.create_task(self._pump(stream))
+        return stream
+        
+    def unregister_stream(self, call_id: str, speaker: str):
+        """Удаляет поток"""
+        key = (call_id, speaker)
+        stream = self.streams.pop(key, None)
+        self.demux.unregister(key)
+        if stream and stream.task:
+            stream.task.cancel()
+            
+    def unregister_call(self, call_id: str):
+        """Удаляет все потоки звонка"""
+        for call, speaker in [key for key in self.streams if key[0] == call_id]:
+            self.unregister_stream(call, speaker)
+            
+    async def _pump(self, stream: AudioStream):
+        """Передает накопленные пакеты потока в callback одним вызовом"""
+        while True:
+            payloads = [await stream.queue.get()]
+            while not stream.queue.empty():
+                payloads.append(stream.queue.get_nowait())
+                
+            try:
+                result = stream.callback(b"".join(payloads))
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Audio callback error for {stream.call_id}/{stream.speaker}: {e}")
+                
+    def get_local_port(self, call_id: str) -> int:
+        """UDP порт, который нужно передать в externalMedia для этого звонка"""
+        return self.port
+                
+    def get_stats(self) -> dict:
+        """Счетчики приема"""
+        streams = list(self.streams.values())
+        stats = [s.get_stats() for s in streams]
+        return {
+            "streams": len(streams),
+            "unknown_packets": self.demux.unknown_packets,
+            "dropped_packets": sum(s.dropped_packets for s in streams),
+            "lost_packets": sum(st.get("lost", 0) for st in stats),
+            "late_packets": sum(st.get("late", 0) for st in stats),
+            "max_jitter_ms": max((st.get("jitter_ms", 0.0) for st in stats), default=0.0),
+        }
+    
+    def get_stream_stats(self, call_id: str) -> dict:
+        """Счетчики jitter buffer по сторонам звонка"""
+        return {
+            speaker: stream.get_stats()
+            for (call, speaker), stream in self.streams.items()
+            if call == call_id
+        }
             
     async def stop(self):
         """Останавливает сервер"""
+        for call_id, speaker in list(self.streams):
+            self.unregister_stream(call_id, speaker)
         if self.transport:
             self.transport.close()
 
@@ -0,0 +1,132 @@
+"""Кольцевой буфер PCM для аудио звонков"""
+import threading
+from enum import Enum
+from typing import Optional
+
+
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"  # перезаписываем самые старые данные
+    DROP_NEWEST = "drop_newest"  # отбрасываем новые данные, пока буфер не освободится
+
+
+class AudioMemoryBudget:
+    """
+    Общий лимит памяти под аудио всех звонков: буферы batch режима и
+    очереди потоков Soniox. Потокобезопасен — очереди освобождает поток стрима
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.allocated_bytes = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, size: int) -> bool:
+        """Резервирует size байт, если они укладываются в лимит"""
+        with self._lock:
+            if self.allocated_bytes + size > self.limit_bytes:
+                return False
+            self.allocated_bytes += size
+            return True
+
+    def release(self, size: int):
+        with self._lock:
+            self.allocated_bytes = max(0, self.allocated_bytes - size)
+
+
+class AudioRingBuffer:
+    """
+    Кольцевой буфер фиксированной емкости с зеркальной половиной: чтение — memoryview без копий.
+    View действителен до перезаписи: после await копируйте (bytes(view))
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        frame_size: int = 2,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+    ):
+        self.frame_size = frame_size
+        self.capacity = capacity - capacity % frame_size
+        self.overflow = OverflowPolicy(overflow)
+        self._data = bytearray(2 * self.capacity)
+        self._view = memoryview(self._data)
+        # Абсолютные позиции чтения и записи
+        self._read = 0
+        self._write = 0
+
+        self.high_water_mark = 0
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        return self._write - self._read
+
+    @property
+    def free(self) -> int:
+        return self.capacity - len(self)
+
+    @property
+    def nbytes(self) -> int:
+        """Выделенная память (с зеркальной половиной)"""
+        return len(self._data)
+
+    @staticmethod
+    def allocation_size(capacity: int) -> int:
+        return 2 * capacity
+
+    def write(self, data) -> int:
+        """Записывает данные, возвращает число отброшенных байт"""
+        data = memoryview(data).cast("B")
+        dropped = 0
+
+        overflow = len(self) + len(data) - self.capacity
+        if overflow > 0:
+            if self.overflow == OverflowPolicy.DROP_OLDEST:
+                if len(data) > self.capacity:
+                    dropped += len(data) - self.capacity
+                    data = data[-self.capacity:]
+                    overflow = len(self) + len(data) - self.capacity
+                overflow = min(len(self), -(-overflow // self.frame_size) * self.frame_size)
+                self._read += overflow
+                dropped += overflow
+            else:
+                keep = self.free - self.free % self.frame_size
+                dropped += len(data) - keep
+                data = data[:keep]
+
+        n = len(data)
+        if n:
+            pos = self._write % self.capacity
+            first = min(n, self.capacity - pos)
+            rest = n - first
+            self._view[pos:pos + first] = data[:first]
+            self._view[pos + self.capacity:pos + self.capacity + first] = data[:first]
+            if rest:
+                self._view[:rest] = data[first:]
+                self._view[self.capacity:self.capacity + rest] = data[first:]
+            self._write += n
+
+        self.high_water_mark = max(self.high_water_mark, len(self))
+        self.dropped_bytes += dropped
+        return dropped
+
+    def peek(self, size: Optional[int] = None) -> memoryview:
+        """Возвращает view на самые старые size байт без копирования"""
+        size = len(self) if size is None else min(size, len(self))
+        pos = self._read % self.capacity
+        return self._view[pos:pos + size]
+
+    def consume(self, size: int) -> int:
+        """Помечает size байт как прочитанные"""
+        size = min(size, len(self))
+        self._read += size
+        return size
+
+    def read(self, size: Optional[int] = None) -> memoryview:
+        """peek + consume"""
+        view = self.peek(size)
+        self.consume(len(view))
+        return view
+
+    def clear(self):
+        """Очищает буфер"""
+        self._read = self._write
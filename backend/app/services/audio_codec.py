@@ -0,0 +1,76 @@
+"""Декодирование G.711 и slin из RTP в 16-bit PCM (NumPy)"""
+from typing import Dict, Iterable, NamedTuple
+
+import numpy as np
+
+
+class CodecInfo(NamedTuple):
+    """Параметры формата ExternalMedia"""
+    name: str
+    sample_rate: int
+    bytes_per_sample: int
+    silence_byte: int  # значение байта тишины для заполнения потерь
+
+
+CODECS: Dict[str, CodecInfo] = {
+    "ulaw": CodecInfo("ulaw", 8000, 1, 0xFF),
+    "alaw": CodecInfo("alaw", 8000, 1, 0xD5),
+    "slin": CodecInfo("slin", 8000, 2, 0x00),
+    "slin16": CodecInfo("slin16", 16000, 2, 0x00),
+}
+
+# Форматы в порядке стоимости для Asterisk и сети
+G711_CODECS = ("ulaw", "alaw")
+
+
+def _ulaw_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    sample = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(u & 0x80, -sample, sample).astype(np.int16)
+
+
+def _alaw_table() -> np.ndarray:
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    exponent = (a >> 4) & 0x07
+    mantissa = (a & 0x0F) << 4
+    sample = np.where(
+        exponent == 0,
+        mantissa + 8,
+        (mantissa + 0x108) << np.maximum(exponent - 1, 0)
+    )
+    return np.where(a & 0x80, sample, -sample).astype(np.int16)
+
+
+# Таблицы байт → отсчет, строятся один раз при импорте
+ULAW_TABLE = _ulaw_table()
+ALAW_TABLE = _alaw_table()
+
+
+def get_codec(name: str) -> CodecInfo:
+    """Параметры формата по имени Asterisk"""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported media format: {name}")
+
+
+def decode(payload: bytes, codec: str) -> np.ndarray:
+    """
+    Декодирует payload в int16 PCM (native byte order).
+    slin в RTP передается в сетевом порядке байт (big-endian)
+    """
+    if codec == "ulaw":
+        return ULAW_TABLE[np.frombuffer(payload, dtype=np.uint8)]
+    if codec == "alaw":
+        return ALAW_TABLE[np.frombuffer(payload, dtype=np.uint8)]
+    if codec in ("slin", "slin16"):
+        size = len(payload) - len(payload) % 2
+        return np.frombuffer(payload, dtype=">i2", count=size // 2).astype(np.int16)
+    raise ValueError(f"Unsupported media format: {codec}")
+
+
+def decode_batch(payloads: Iterable[bytes], codec: str) -> np.ndarray:
+    """Декодирует пачку payload одним обращением к таблице"""
+    return decode(b"".join(payloads), codec)
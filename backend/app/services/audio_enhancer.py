@@ -0,0 +1,139 @@
+"""Шумоподавление и АРУ перед STT (NumPy)"""
+import numpy as np
+
+
+class SpectralDenoiser:
+    """
+    Шумоподавление спектральным вычитанием (STFT, sqrt-Hann, перекрытие 50%).
+    Спектр шума — медленно растущий минимум; задержка — половина окна
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 32,
+        over_subtraction: float = 2.0,
+        floor_db: float = -12.0,
+        noise_rise_db: float = 3.0,
+        gain_smoothing: float = 0.5
+    ):
+        n = 1 << max(4, int(round(np.log2(sample_rate * frame_ms / 1000))))
+        self.frame_len = n
+        self.hop = n // 2
+        self.over_subtraction = over_subtraction
+        self.floor = 10 ** (floor_db / 20)
+        # Рост оценки шума за кадр (по мощности)
+        self.noise_rise = 10 ** (noise_rise_db / 10 * self.hop / sample_rate)
+        self.gain_smoothing = gain_smoothing
+
+        self._window = np.sqrt(np.hanning(n + 1)[:n]).astype(np.float32)
+        self._input = np.zeros(self.hop, dtype=np.float32)  # последняя половина кадра + остаток
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        self.noise: np.ndarray = None
+        self._smoothed: np.ndarray = None
+        self._gain = np.ones(n // 2 + 1, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """float32 → float32; выход отстает от входа на hop отсчетов"""
+        x = np.concatenate((self._input, samples.astype(np.float32, copy=False)))
+        n_frames = len(x) // self.hop - 1
+        if n_frames < 1:
+            self._input = x
+            return np.empty(0, dtype=np.float32)
+
+        blocks = x[:(n_frames + 1) * self.hop].reshape(n_frames + 1, self.hop)
+        frames = np.concatenate((blocks[:-1], blocks[1:]), axis=1) * self._window
+        self._input = x[n_frames * self.hop:]
+
+        spectrum = np.fft.rfft(frames, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        gains = np.empty_like(power, dtype=np.float32)
+        for i in range(n_frames):
+            p = power[i]
+            if self.noise is None:
+                self._smoothed = p.copy()
+                self.noise = p.copy()
+            else:
+                # Минимум сглаженного спектра: периодограмма шума сильно флуктуирует
+                self._smoothed = 0.7 * self._smoothed + 0.3 * p
+                self.noise = np.where(
+                    self._smoothed < self.noise, self._smoothed, self.noise * self.noise_rise
+                )
+            gain = np.sqrt(np.maximum(1.0 - self.over_subtraction * self.noise / (p + 1e-9), self.floor ** 2))
+            self._gain = self.gain_smoothing * self._gain + (1 - self.gain_smoothing) * gain
+            gains[i] = self._gain
+
+        frames = np.fft.irfft(spectrum * gains, n=self.frame_len, axis=1).astype(np.float32) * self._window
+        out = np.zeros((n_frames + 1, self.hop), dtype=np.float32)
+        out[:-1] += frames[:, :self.hop]
+        out[1:] += frames[:, self.hop:]
+        out[0] += self._overlap
+        self._overlap = out[-1]
+        return out[:-1].ravel()
+
+
+class AutomaticGainControl:
+    """АРУ: уровень речи к target_db по блокам 10 мс; паузы ниже gate_db усиление не меняют"""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        target_db: float = -20.0,
+        max_gain_db: float = 24.0,
+        min_gain_db: float = -12.0,
+        gate_db: float = -50.0,
+        attack_ms: float = 20.0,
+        release_ms: float = 1500.0
+    ):
+        self.block = sample_rate // 100
+        self.target_db = target_db
+        self.max_gain_db = max_gain_db
+        self.min_gain_db = min_gain_db
+        self.gate_db = gate_db
+        self.attack = float(np.exp(-10.0 / attack_ms))
+        self.release = float(np.exp(-10.0 / release_ms))
+
+        self.gain_db = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """float32 → float32 той же длины (неполный блок — с текущим усилением)"""
+        x = samples.astype(np.float32, copy=False)
+        n_blocks = len(x) // self.block
+        if n_blocks == 0:
+            return x * np.float32(10 ** (self.gain_db / 20))
+
+        blocks = x[:n_blocks * self.block].reshape(n_blocks, self.block)
+        level_db = 10 * np.log10(np.mean(blocks * blocks, axis=1) / (32768.0 ** 2) + 1e-12)
+        desired = np.clip(self.target_db - level_db, self.min_gain_db, self.max_gain_db)
+
+        gain_db = np.empty(n_blocks + 1, dtype=np.float32)
+        gain_db[0] = self.gain_db
+        for i in range(n_blocks):
+            if level_db[i] >= self.gate_db:
+                coef = self.attack if desired[i] < self.gain_db else self.release
+                self.gain_db = coef * self.gain_db + (1 - coef) * float(desired[i])
+            gain_db[i + 1] = self.gain_db
+
+        # Линейная интерполяция усиления внутри блока
+        ramp = np.linspace(0.0, 1.0, self.block, endpoint=False, dtype=np.float32)
+        curve = gain_db[:-1, None] + (gain_db[1:] - gain_db[:-1])[:, None] * ramp
+        out = np.empty_like(x)
+        out[:n_blocks * self.block] = (blocks * 10 ** (curve / 20)).ravel()
+        out[n_blocks * self.block:] = x[n_blocks * self.block:] * np.float32(10 ** (self.gain_db / 20))
+        return out
+
+
+class AudioEnhancer:
+    """Шумоподавление и/или АРУ одного потока: int16 → int16"""
+
+    def __init__(self, sample_rate: int = 16000, noise_suppression: bool = True, agc: bool = True):
+        self.denoiser = SpectralDenoiser(sample_rate) if noise_suppression else None
+        self.agc = AutomaticGainControl(sample_rate) if agc else None
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        x = pcm.astype(np.float32)
+        if self.denoiser is not None:
+            x = self.denoiser.process(x)
+        if self.agc is not None:
+            x = self.agc.process(x)
+        return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
@@ -0,0 +1,37 @@
+"""Конвейер обработки входящего аудио одной стороны звонка"""
+import numpy as np
+
+from ..config import get_settings
+from .audio_codec import decode, get_codec
+from .audio_enhancer import AudioEnhancer
+from .resampler import StreamingResampler
+
+settings = get_settings()
+
+
+class AudioPipeline:
+    """
+    Превращает payload RTP одного потока в 16-bit PCM для STT:
+    декодирование → ресемплинг до soniox_sample_rate → (опционально)
+    шумоподавление и АРУ. Состояние (фильтр ресемплера, оценка шума,
+    усиление) живет столько же, сколько поток
+    """
+    
+    def __init__(
+        self,
+        media_format: str = "slin16",
+        sample_rate: int = settings.soniox_sample_rate,
+        noise_suppression: bool = False,
+        agc: bool = False
+    ):
+        self.codec = get_codec(media_format)
+        self.sample_rate = sample_rate
+        self.resampler = StreamingResampler(self.codec.sample_rate, sample_rate)
+        self.enhancer = AudioEnhancer(sample_rate, noise_suppression, agc) if noise_suppression or agc else None
+        
+    def process(self, payload: bytes) -> np.ndarray:
+        """Обрабатывает пачку payload одним вызовом"""
+        pcm = self.resampler.process(decode(payload, self.codec.name))
+        if self.enhancer is not None:
+            pcm = self.enhancer.process(pcm)
+        return pcm
@@ -1,12 +1,102 @@
 """Менеджер звонков"""
 import asyncio
 from datetime import datetime
-from typing import Dict, Optional, Callable, List
+from typing import Dict, Optional, Callable, List, NamedTuple, Tuple
+import numpy as np
 from loguru import logger
 
-from ..schemas.events import Call, CallStatus, CallDirection, TranscriptSegment, Suggestion, CallEvent
-from .transcription import transcription_service
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models.call_session import CallSession
+from ..models.company import Company
+from ..models.phone_number import PhoneNumber
+from ..schemas.events import Call, CallStatus, CallDirection, TranscriptSegment, TranscriptPartial, Suggestion, CallEvent
+from .audio_buffer import AudioMemoryBudget, AudioRingBuffer, OverflowPolicy
+from .audio_pipeline import AudioPipeline
+from .dsp_pool import dsp_pool
+from .line_classifier import LINE_EVENTS, LIVE_SPEECH, LineClassifier
+from .vad import SPEECH_END, SPEECH_START, SpeechGate, VoiceActivityDetector, load_vad_model
+from .transcription import StreamingSession, TranscriptDelta, realtime_transcription
+from .stt_scheduler import stt_scheduler
 from .ai_agent import ai_agent
+from .suggestion_worker import SuggestionWorker
+from .objection_rules import ObjectionDetector, compile_rules
+from .recording_transcriber import leg_speakers, recording_transcriber
+from .asterisk_ari import ari_service
+from .media_ingest import media_receiver
+
+settings = get_settings()
+
+SAMPLE_RATE = settings.soniox_sample_rate
+BYTES_PER_SAMPLE = 2
+SPEAKERS = ("operator", "client")
+FRAME_BYTES = SAMPLE_RATE // 50 * BYTES_PER_SAMPLE  # 20 мс, единица учета потерь
+
+# Политика бюджета → поведение кольцевого буфера при переполнении
+BUDGET_POLICIES = {
+    "drop_oldest": OverflowPolicy.DROP_OLDEST,
+    "pause": OverflowPolicy.DROP_NEWEST,
+}
+
+
+class ChunkingConfig(NamedTuple):
+    """Границы чанков для STT (переопределяются в Company.settings)"""
+    min_seconds: float  # короче — не отправляем по концу речи, ждем продолжения
+    max_seconds: float  # длиннее — отправляем, не дожидаясь конца речи
+    endpoint_silence_ms: int  # пауза, после которой речь считается законченной
+    
+    @classmethod
+    def from_company_settings(cls, company_settings: dict) -> "ChunkingConfig":
+        return cls(
+            min_seconds=float(company_settings.get("stt_min_chunk_seconds", settings.stt_min_chunk_seconds)),
+            max_seconds=float(company_settings.get("stt_max_chunk_seconds", settings.stt_max_chunk_seconds)),
+            endpoint_silence_ms=int(company_settings.get("stt_endpoint_silence_ms", settings.stt_endpoint_silence_ms)),
+        )
+    
+    @property
+    def min_bytes(self) -> int:
+        return int(self.min_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    
+    @property
+    def max_bytes(self) -> int:
+        return int(self.max_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+
+
+def _load_company_settings(company_id: Optional[int], called: str) -> Tuple[Optional[int], dict]:
+    """Находит компанию звонка (по id или по набранному номеру) и ее настройки"""
+    db = SessionLocal()
+    try:
+        if company_id is None:
+            phone = db.query(PhoneNumber).filter(PhoneNumber.number == called).first()
+            company_id = phone.company_id if phone else None
+        if company_id is None:
+            return None, {}
+        company = db.query(Company).filter(Company.id == company_id).first()
+        return company_id, dict(company.settings or {}) if company else {}
+    finally:
+        db.close()
+
+
+def _save_call_session(call: Call, company_id: int):
+    """Сохраняет завершенный звонок; транскрипт записи дописывается позже"""
+    db = SessionLocal()
+    try:
+        ended_at = call.ended_at or datetime.now()
+        db.add(CallSession(
+            company_id=company_id,
+            call_id=call.id,
+            direction="outbound" if call.direction == CallDirection.OUTGOING else "inbound",
+            caller_number=call.caller_number,
+            called_number=call.called_number,
+            started_at=call.started_at,
+            answered_at=call.answered_at,
+            ended_at=ended_at,
+            duration=int((ended_at - call.answered_at).total_seconds()) if call.answered_at else 0,
+            status="ended"
+        ))
+        db.commit()
+    finally:
+        db.close()
 
 
 class CallManager:
@@ -15,8 +105,34 @@ class CallManager:
     def __init__(self):
         self.active_calls: Dict[str, Call] = {}
         self.event_subscribers: List[Callable] = []
-        self.audio_buffers: Dict[str, Dict[str, bytearray]] = {}
+        self.audio_buffers: Dict[str, Dict[str, AudioRingBuffer]] = {}
+        self.audio_pipelines: Dict[str, Dict[str, AudioPipeline]] = {}
+        self.speech_gates: Dict[str, Dict[str, SpeechGate]] = {}
+        self.line_classifiers: Dict[str, Dict[str, LineClassifier]] = {}
+        # (call_id, speaker) → on_hold / machine_detected: сторона не транскрибируется
+        self.line_states: Dict[Tuple[str, str], str] = {}
         self.transcription_tasks: Dict[str, asyncio.Task] = {}
+        self.company_ids: Dict[str, Optional[int]] = {}
+        self.company_settings: Dict[str, dict] = {}
+        self.chunking: Dict[str, ChunkingConfig] = {}
+        self.flush_queues: Dict[str, asyncio.Queue] = {}
+        self.stt_sessions: Dict[str, Dict[str, StreamingSession]] = {}
+        self.suggestion_workers: Dict[str, SuggestionWorker] = {}
+        self.objection_detectors: Dict[str, ObjectionDetector] = {}
+        self.media_legs: Dict[str, List[dict]] = {}  # snoop/ExternalMedia каналы звонка
+        self.rule_suggestions = 0
+        self.rule_skipped_llm = 0
+        self.suggestion_totals = {"requests": 0, "superseded": 0, "merged_segments": 0, "suggestions": 0}
+        self._flush_pending: set = set()
+        self._speaking: set = set()  # (call_id, speaker), у которых сейчас идет речь
+        self.audio_budget = AudioMemoryBudget(int(settings.audio_global_budget_mb * 1024 * 1024))
+        self.audio_policy = BUDGET_POLICIES[settings.audio_budget_policy]
+        self.rejected_audio_calls = 0
+        self.dropped_frames_total = 0
+        self._background_tasks: set = set()
+        self.vad_model = (
+            load_vad_model(settings.vad_model, SAMPLE_RATE) if settings.vad_model else None
+        )
         
     def subscribe(self, callback: Callable):
         """Подписывает на события звонков"""
@@ -34,15 +150,35 @@ class CallManager:
                 await callback(event)
             except Exception as e:
                 logger.error(f"Event callback error: {e}")
+                
+    def _emit_soon(self, event: CallEvent):
+        """Отправляет событие из синхронного кода (аудио-тракт)"""
+        self._spawn(self.emit_event(event))
+        
+    def _spawn(self, coro):
+        """Фоновая задача, ссылка на которую хранится до завершения"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
     
     async def handle_call_start(
         self, 
         call_id: str, 
         caller: str, 
         called: str,
-        direction: CallDirection = CallDirection.INCOMING
+        direction: CallDirection = CallDirection.INCOMING,
+        company_id: Optional[int] = None
     ):
         """Обрабатывает начало звонка"""
+        try:
+            company_id, company_settings = await asyncio.to_thread(
+                _load_company_settings, company_id, called
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load company settings for call {call_id}: {e}")
+            company_settings = {}
+        chunking = ChunkingConfig.from_company_settings(company_settings)
+        
         call = Call(
             id=call_id,
             caller_number=caller,
@@ -53,10 +189,50 @@ class CallManager:
         )
         
         self.active_calls[call_id] = call
-        self.audio_buffers[call_id] = {
-            "operator": bytearray(),
-            "client": bytearray()
-        }
+        self.company_ids[call_id] = company_id
+        self.company_settings[call_id] = company_settings
+        self.chunking[call_id] = chunking
+        self.suggestion_workers[call_id] = SuggestionWorker(
+            call_id,
+            lambda suggestion: self._emit_suggestion(call_id, suggestion),
+            lambda delta: self.emit_event(CallEvent(
+                event_type="suggestion_delta",
+                call_id=call_id,
+                data=delta.model_dump()
+            )),
+            debounce=settings.llm_suggest_debounce_ms / 1000,
+            max_delay=settings.llm_suggest_max_delay_ms / 1000,
+            company_id=company_id,
+            supersede_window=settings.llm_supersede_window_ms / 1000,
+            max_superseded=settings.llm_max_superseded
+        )
+        if company_settings.get("objection_rules_enabled", settings.objection_rules_enabled):
+            self.objection_detectors[call_id] = ObjectionDetector(
+                call_id, compile_rules(company_settings), settings.objection_rule_cooldown_seconds
+            )
+        streaming = (
+            company_settings.get("stt_mode", settings.stt_mode) == "streaming"
+            and stt_scheduler.reserve_streams(
+                call_id, len(SPEAKERS), company_id, company_settings.get("stt_max_streams")
+            )
+            and self._open_stt_sessions(call_id)
+        )
+        if not streaming:
+            self.flush_queues[call_id] = asyncio.Queue()
+            self._allocate_audio_buffers(call_id, chunking)
+        if settings.vad_enabled:
+            self.speech_gates[call_id] = {
+                "operator": self._create_speech_gate(chunking),
+                "client": self._create_speech_gate(chunking)
+            }
+        self.line_classifiers[call_id] = {}
+        for speaker in SPEAKERS:
+            line_options = self._line_options(call_id, speaker)
+            if line_options is not None:
+                self.line_classifiers[call_id][speaker] = LineClassifier(SAMPLE_RATE, **line_options)
+        
+        if settings.realtime_media_enabled:
+            self._spawn(self._start_realtime_media(call_id))
         
         logger.info(f"Call started: {call_id} from {caller}")
         
@@ -66,10 +242,60 @@ class CallManager:
             data=call.model_dump(mode="json")
         ))
         
-        # Запускаем фоновую задачу транскрипции
-        self.transcription_tasks[call_id] = asyncio.create_task(
-            self._transcription_loop(call_id)
-        )
+        # Запускаем фоновую задачу транскрипции (в потоковом режиме чанки не нужны)
+        if not streaming:
+            self.transcription_tasks[call_id] = asyncio.create_task(
+                self._transcription_loop(call_id)
+            )
+    
+    def _open_stt_sessions(self, call_id: str) -> bool:
+        """Открывает потоки Soniox для обеих сторон; при ошибке звонок идет в batch режиме"""
+        sessions = {}
+        try:
+            for speaker in SPEAKERS:
+                sessions[speaker] = realtime_transcription.open_session(
+                    call_id,
+                    speaker,
+                    lambda speaker, delta: self._handle_stream_segment(call_id, speaker, delta),
+                    budget=self.audio_budget
+                )
+        except Exception as e:
+            logger.error(f"Failed to open Soniox streams for {call_id}, falling back to batch: {e}")
+            for session in sessions.values():
+                self._spawn(session.close())
+            stt_scheduler.release_streams(call_id)
+            return False
+        self.stt_sessions[call_id] = sessions
+        return True
+    
+    async def _start_realtime_media(self, call_id: str):
+        """
+        Подключает RTP сторон звонка: snoop канала (UNIQUEID = id канала ARI)
+        → ExternalMedia → media_receiver. При ошибке звонок идет без real-time
+        """
+        call = self.active_calls.get(call_id)
+        if call is None:
+            return
+        direction = "outbound" if call.direction == CallDirection.OUTGOING else "inbound"
+        try:
+            media_format = await ari_service.choose_media_format(call_id)
+            external_host = f"{settings.media_external_host}:{media_receiver.get_local_port(call_id)}"
+            for spy, speaker in zip(("in", "out"), leg_speakers(direction)):
+                leg = await ari_service.start_leg_media(call_id, spy, external_host, media_format)
+                if call_id not in self.active_calls:
+                    # Звонок завершился, пока создавались каналы
+                    await ari_service.stop_leg_media(leg)
+                    return
+                self.media_legs.setdefault(call_id, []).append(leg)
+                media_receiver.register_stream(
+                    call_id,
+                    speaker,
+                    self.attach_media(call_id, speaker, media_format),
+                    remote_addr=ari_service.get_external_media_address(leg["channel"]),
+                    media_format=media_format
+                )
+        except Exception as e:
+            logger.error(f"Failed to start real-time media for {call_id}: {e}")
         
     async def handle_call_answer(self, call_id: str):
         """Обрабатывает ответ на звонок"""
@@ -89,10 +315,25 @@ class CallManager:
             self.active_calls[call_id].status = CallStatus.ENDED
             self.active_calls[call_id].ended_at = datetime.now()
             
-            # Останавливаем транскрипцию
+            # Останавливаем прием RTP и транскрипцию
+            media_receiver.unregister_call(call_id)
+            for leg in self.media_legs.pop(call_id, []):
+                self._spawn(ari_service.stop_leg_media(leg))
             if call_id in self.transcription_tasks:
                 self.transcription_tasks[call_id].cancel()
                 del self.transcription_tasks[call_id]
+            # Потоки закрываются до call_end, чтобы последние фразы успели прийти
+            sessions = self.stt_sessions.pop(call_id, {})
+            await asyncio.gather(*(session.close() for session in sessions.values()))
+            stt_scheduler.release_streams(call_id)
+            stt_scheduler.cancel_call(call_id)
+            self.objection_detectors.pop(call_id, None)
+            worker = self.suggestion_workers.pop(call_id, None)
+            if worker is not None:
+                await worker.close()
+                for key, value in worker.get_stats().items():
+                    if key in self.suggestion_totals:
+                        self.suggestion_totals[key] += value
             
             await self.emit_event(CallEvent(
                 event_type="call_end",
@@ -100,70 +341,409 @@ class CallManager:
                 data=self.active_calls[call_id].model_dump(mode="json")
             ))
             
+            # Сохраняем звонок и ставим записи MixMonitor в очередь транскрипции
+            company_id = self.company_ids.get(call_id)
+            if company_id is not None:
+                try:
+                    await asyncio.to_thread(_save_call_session, self.active_calls[call_id], company_id)
+                    recording_transcriber.enqueue(call_id, delay=settings.recording_settle_seconds)
+                except Exception as e:
+                    logger.error(f"Failed to save call session {call_id}: {e}")
+            
             # Очищаем
             logger.info(f"Call ended: {call_id}")
             del self.active_calls[call_id]
             
             if call_id in self.audio_buffers:
-                del self.audio_buffers[call_id]
+                for buffer in self.audio_buffers.pop(call_id).values():
+                    self.audio_budget.release(buffer.nbytes)
+            self.audio_pipelines.pop(call_id, None)
+            if dsp_pool is not None:
+                for speaker in SPEAKERS:
+                    dsp_pool.close_stream((call_id, speaker))
+            self.speech_gates.pop(call_id, None)
+            self.line_classifiers.pop(call_id, None)
+            self.company_ids.pop(call_id, None)
+            self.company_settings.pop(call_id, None)
+            self.chunking.pop(call_id, None)
+            self.flush_queues.pop(call_id, None)
+            for speaker in SPEAKERS:
+                self._flush_pending.discard((call_id, speaker))
+                self._speaking.discard((call_id, speaker))
+                self.line_states.pop((call_id, speaker), None)
                 
             ai_agent.clear_call(call_id)
     
+    def _allocate_audio_buffers(self, call_id: str, chunking: ChunkingConfig):
+        """
+        Выделяет буферы сторон звонка в пределах глобального бюджета.
+        Если полный бюджет звонка не помещается, пробуем минимальный
+        (один максимальный чанк); иначе звонок идет без транскрипции
+        """
+        full = int(settings.audio_buffer_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+        for capacity in (full, min(full, chunking.max_bytes)):
+            size = AudioRingBuffer.allocation_size(capacity) * len(SPEAKERS)
+            if self.audio_budget.try_reserve(size):
+                self.audio_buffers[call_id] = {
+                    speaker: AudioRingBuffer(
+                        capacity=capacity,
+                        frame_size=BYTES_PER_SAMPLE,
+                        overflow=self.audio_policy
+                    )
+                    for speaker in SPEAKERS
+                }
+                if capacity < full:
+                    logger.warning(f"Audio budget is low, call {call_id} gets reduced buffers")
+                return
+        
+        self.rejected_audio_calls += 1
+        logger.error(f"Audio budget exhausted, call {call_id} will not be transcribed")
+    
+    def _create_speech_gate(self, chunking: ChunkingConfig) -> SpeechGate:
+        """VAD одной стороны звонка"""
+        detector = VoiceActivityDetector(
+            sample_rate=SAMPLE_RATE,
+            hangover_frames=max(1, chunking.endpoint_silence_ms // 20),
+            model=self.vad_model
+        )
+        return SpeechGate(detector)
+    
+    def _pipeline_options(self, call_id: str) -> dict:
+        """Шумоподавление и АРУ звонка (Company.settings или глобальные настройки)"""
+        company_settings = self.company_settings.get(call_id, {})
+        return {
+            "noise_suppression": bool(company_settings.get("noise_suppression", settings.noise_suppression_enabled)),
+            "agc": bool(company_settings.get("agc", settings.agc_enabled)),
+        }
+    
+    def _line_options(self, call_id: str, speaker: str) -> Optional[dict]:
+        """Параметры LineClassifier стороны звонка; None — классификатор выключен"""
+        company_settings = self.company_settings.get(call_id, {})
+        if not company_settings.get("line_classifier", settings.line_classifier_enabled):
+            return None
+        call = self.active_calls.get(call_id)
+        # Автоответчик отвечает только на исходящий звонок
+        detect_machine = (
+            call is not None
+            and call.direction == CallDirection.OUTGOING
+            and speaker == "client"
+            and bool(company_settings.get("machine_detection", settings.machine_detection_enabled))
+        )
+        return {"detect_machine": detect_machine}
+    
+    def attach_media(self, call_id: str, speaker: str, media_format: str = "slin16") -> Callable:
+        """
+        Подключает RTP поток стороны звонка.
+        Возвращает callback для AudioStreamReceiver.register_stream.
+        С пулом DSP декодирование и VAD выполняются в процессах-воркерах
+        """
+        if dsp_pool is not None:
+            chunking = self.chunking.get(call_id)
+            hangover_frames = None
+            if settings.vad_enabled and chunking is not None:
+                hangover_frames = max(1, chunking.endpoint_silence_ms // 20)
+            dsp_pool.open_stream(
+                (call_id, speaker),
+                media_format,
+                hangover_frames,
+                self._line_options(call_id, speaker),
+                self._pipeline_options(call_id)
+            )
+            return lambda payload: self.add_media_offloaded(call_id, speaker, payload)
+        
+        self.audio_pipelines.setdefault(call_id, {})[speaker] = AudioPipeline(
+            media_format, **self._pipeline_options(call_id)
+        )
+        return lambda payload: self.add_media(call_id, speaker, payload)
+    
+    def add_media(self, call_id: str, speaker: str, payload: bytes):
+        """Декодирует payload RTP и добавляет PCM в буфер"""
+        pipeline = self.audio_pipelines.get(call_id, {}).get(speaker)
+        if pipeline is not None:
+            self.add_audio_chunk(call_id, speaker, pipeline.process(payload))
+    
+    async def add_media_offloaded(self, call_id: str, speaker: str, payload: bytes):
+        """Отправляет payload в пул DSP; готовый (уже прошедший VAD) PCM пишется в буфер"""
+        await dsp_pool.process(
+            (call_id, speaker),
+            payload,
+            lambda pcm, events: self._write_audio(call_id, speaker, pcm, events)
+        )
+    
     def add_audio_chunk(self, call_id: str, speaker: str, audio_data: bytes):
-        """Добавляет аудио-чанк в буфер"""
+        """
+        Добавляет аудио-чанк (16-bit PCM) в буфер.
+        При включенном VAD в буфер попадает только речь, тишина до STT не доходит
+        """
+        if call_id in self.active_calls:
+            events = []
+            pcm = audio_data if isinstance(audio_data, np.ndarray) else np.frombuffer(audio_data, dtype=np.int16)
+            classifier = self.line_classifiers.get(call_id, {}).get(speaker)
+            if classifier is not None:
+                events.extend(classifier.process(pcm))
+            gate = self.speech_gates.get(call_id, {}).get(speaker)
+            if gate is not None:
+                audio_data, gate_events = gate.process(pcm)
+                events.extend(gate_events)
+            self._write_audio(call_id, speaker, audio_data, events)
+    
+    def _write_audio(self, call_id: str, speaker: str, audio_data, events: List[str]):
+        """
+        Публикует границы речи и передает PCM после VAD дальше:
+        в поток Soniox или в буфер с endpointing (batch режим).
+        Пока на стороне музыка ожидания или автоответчик, аудио не передается
+        """
+        if call_id not in self.active_calls:
+            return
+        for event_type in events:
+            if event_type in LINE_EVENTS:
+                self._set_line_state(call_id, speaker, event_type)
+            elif event_type == SPEECH_START:
+                self._speaking.add((call_id, speaker))
+            else:
+                self._speaking.discard((call_id, speaker))
+            if event_type not in LINE_EVENTS and (call_id, speaker) in self.line_states:
+                continue  # "речь" в музыке не показываем
+            self._emit_soon(CallEvent(
+                event_type=event_type,
+                call_id=call_id,
+                data={"speaker": speaker, "timestamp": datetime.now().timestamp()}
+            ))
+        if (call_id, speaker) in self.line_states:
+            return
+        
+        session = self.stt_sessions.get(call_id, {}).get(speaker)
+        if session is not None:
+            session.feed(audio_data)
+            if SPEECH_END in events:
+                session.feed_silence(settings.stt_stream_endpoint_padding_ms)
+            return
+        
         if call_id in self.audio_buffers and speaker in self.audio_buffers[call_id]:
-            self.audio_buffers[call_id][speaker].extend(audio_data)
+            buffer = self.audio_buffers[call_id][speaker]
+            chunking = self.chunking[call_id]
+            if len(audio_data):
+                first_drop = buffer.dropped_bytes == 0
+                dropped = buffer.write(audio_data)
+                if dropped:
+                    self.dropped_frames_total += -(-dropped // FRAME_BYTES)
+                    if first_drop:
+                        logger.warning(f"Audio buffer full for {call_id}/{speaker}, policy {settings.audio_budget_policy}")
+            
+            # Endpointing: конец речи (если набран минимум) или предел длины чанка
+            if SPEECH_END in events and len(buffer) >= chunking.min_bytes:
+                self._request_flush(call_id, speaker, "endpoint")
+            elif len(buffer) >= chunking.max_bytes:
+                self._request_flush(call_id, speaker, "max_duration")
+                
+    def _set_line_state(self, call_id: str, speaker: str, event_type: str):
+        """Приостанавливает транскрипцию стороны или возобновляет ее, когда снова слышна речь"""
+        key = (call_id, speaker)
+        if event_type == LIVE_SPEECH:
+            if self.line_states.pop(key, None):
+                logger.info(f"Live speech on {call_id}/{speaker}, transcription resumed")
+            return
+        
+        suspended = key in self.line_states
+        self.line_states[key] = event_type
+        if suspended:
+            return
+        logger.info(f"{event_type} on {call_id}/{speaker}, transcription paused")
+        # Накопленное аудио — уже музыка или приветствие автоответчика
+        session = self.stt_sessions.get(call_id, {}).get(speaker)
+        if session is not None:
+            session.feed_silence(settings.stt_stream_endpoint_padding_ms)
+        buffer = self.audio_buffers.get(call_id, {}).get(speaker)
+        if buffer is not None:
+            buffer.clear()
+                
+    def _request_flush(self, call_id: str, speaker: str, reason: str):
+        """Ставит сторону звонка в очередь на транскрипцию (не более одного раза)"""
+        if (call_id, speaker) in self._flush_pending or call_id not in self.flush_queues:
+            return
+        self._flush_pending.add((call_id, speaker))
+        self.flush_queues[call_id].put_nowait((speaker, reason))
             
     async def _transcription_loop(self, call_id: str):
-        """Фоновая задача для периодической транскрипции"""
-        CHUNK_DURATION = 3.0  # секунды
-        SAMPLE_RATE = 16000
-        BYTES_PER_SAMPLE = 2
-        CHUNK_SIZE = int(SAMPLE_RATE * CHUNK_DURATION * BYTES_PER_SAMPLE)
+        """
+        Фоновая задача транскрипции: отправляет чанк, как только речь закончилась
+        или достигнута максимальная длина. Остаток, не добравший минимум,
+        отправляется после паузы длиной max_seconds
+        """
+        queue = self.flush_queues[call_id]
+        chunking = self.chunking[call_id]
         
         while call_id in self.active_calls:
-            await asyncio.sleep(CHUNK_DURATION)
+            try:
+                speaker, reason = await asyncio.wait_for(queue.get(), timeout=chunking.max_seconds)
+            except asyncio.TimeoutError:
+                for speaker in SPEAKERS:
+                    buffer = self.audio_buffers.get(call_id, {}).get(speaker)
+                    if buffer is not None and len(buffer) and (call_id, speaker) not in self._speaking:
+                        await self._transcribe_buffer(call_id, speaker, "idle")
+                continue
             
-            for speaker in ["operator", "client"]:
-                if call_id not in self.audio_buffers:
-                    continue
-                    
-                buffer = self.audio_buffers[call_id][speaker]
-                
-                if len(buffer) >= CHUNK_SIZE:
-                    # Извлекаем чанк
-                    chunk = bytes(buffer[:CHUNK_SIZE])
-                    del buffer[:CHUNK_SIZE]
-                    
-                    # Транскрибируем
-                    text = await transcription_service.transcribe_chunk(chunk)
-                    
-                    if text and text.strip():
-                        segment = TranscriptSegment(
-                            call_id=call_id,
-                            timestamp=datetime.now().timestamp(),
-                            speaker=speaker,
-                            text=text.strip()
-                        )
-                        
-                        # Отправляем транскрипт
-                        await self.emit_event(CallEvent(
-                            event_type="transcript",
-                            call_id=call_id,
-                            data=segment.model_dump()
-                        ))
-                        
-                        # Анализируем через AI
-                        suggestion = await ai_agent.analyze_and_suggest(
-                            call_id, segment
-                        )
-                        
-                        if suggestion:
-                            await self.emit_event(CallEvent(
-                                event_type="suggestion",
-                                call_id=call_id,
-                                data=suggestion.model_dump(mode="json")
-                            ))
+            self._flush_pending.discard((call_id, speaker))
+            await self._transcribe_buffer(call_id, speaker, reason)
+            
+    async def _transcribe_buffer(self, call_id: str, speaker: str, reason: str):
+        """Транскрибирует накопленное аудио стороны звонка (не больше max_seconds)"""
+        buffer = self.audio_buffers.get(call_id, {}).get(speaker)
+        if buffer is None or not len(buffer):
+            return
+        
+        # Извлекаем чанк (view без копирования)
+        chunk = buffer.read(min(len(buffer), self.chunking[call_id].max_bytes))
+        logger.debug(f"STT chunk {call_id}/{speaker}: {len(chunk) / (SAMPLE_RATE * BYTES_PER_SAMPLE):.2f}s ({reason})")
+        
+        # Транскрибируем через общую очередь (лимиты провайдера, справедливость между звонками)
+        text = await stt_scheduler.submit(
+            call_id,
+            speaker,
+            chunk,
+            company_id=self.company_ids.get(call_id),
+            company_limit=self.company_settings.get(call_id, {}).get("stt_max_concurrent")
+        )
+        
+        if text and text.strip():
+            await self._handle_transcript(call_id, speaker, text.strip())
+            
+    async def _handle_stream_segment(self, call_id: str, speaker: str, delta: TranscriptDelta):
+        """
+        Результат потока Soniox: промежуточный — дельтой на экран,
+        финальный — обычным сегментом с тем же segment_id
+        """
+        if call_id not in self.active_calls:
+            return
+        if delta.is_final:
+            segment = await self._publish_transcript(call_id, speaker, delta.text, delta.segment_id)
+            self._suggest(call_id, segment)
+            return
+        
+        partial = TranscriptPartial(
+            call_id=call_id,
+            segment_id=delta.segment_id,
+            timestamp=datetime.now().timestamp(),
+            speaker=speaker,
+            op=delta.op,
+            keep=delta.keep,
+            tokens=delta.tokens
+        )
+        await self.emit_event(CallEvent(
+            event_type="transcript_partial",
+            call_id=call_id,
+            data=partial.model_dump()
+        ))
+    
+    async def _handle_transcript(self, call_id: str, speaker: str, text: str):
+        """Публикует сегмент транскрипции и запрашивает подсказку"""
+        segment = await self._publish_transcript(call_id, speaker, text)
+        self._suggest(call_id, segment)
+        
+    async def _publish_transcript(
+        self,
+        call_id: str,
+        speaker: str,
+        text: str,
+        segment_id: Optional[str] = None
+    ) -> TranscriptSegment:
+        segment = TranscriptSegment(
+            call_id=call_id,
+            timestamp=datetime.now().timestamp(),
+            speaker=speaker,
+            text=text,
+            segment_id=segment_id
+        )
+        
+        # Отправляем транскрипт
+        await self.emit_event(CallEvent(
+            event_type="transcript",
+            call_id=call_id,
+            data=segment.model_dump()
+        ))
+        return segment
+        
+    def _suggest(self, call_id: str, segment: TranscriptSegment):
+        """
+        Передает сегмент в очередь подсказок звонка (не музыку и не автоответчик).
+        Подсказки по правилам возражений отправляются сразу; уверенное
+        правило может заменить запрос к LLM. Запрос идет в фоне, чтобы
+        не задерживать следующие результаты STT
+        """
+        if (call_id, segment.speaker) in self.line_states:
+            return
+        analyze = True
+        detector = self.objection_detectors.get(call_id)
+        if detector is not None:
+            matches = detector.match(segment)
+            for match in matches:
+                self.rule_suggestions += 1
+                self._spawn(self._emit_suggestion(call_id, match.suggestion))
+            company_settings = self.company_settings.get(call_id, {})
+            if matches and company_settings.get("objection_skip_llm", settings.objection_skip_llm):
+                threshold = float(company_settings.get(
+                    "objection_skip_llm_confidence", settings.objection_skip_llm_confidence
+                ))
+                if max(match.confidence for match in matches) >= threshold:
+                    analyze = False
+                    self.rule_skipped_llm += 1
+        worker = self.suggestion_workers.get(call_id)
+        if worker is not None:
+            worker.submit(segment, analyze)
+            
+    async def _emit_suggestion(self, call_id: str, suggestion: Suggestion):
+        await self.emit_event(CallEvent(
+            event_type="suggestion",
+            call_id=call_id,
+            data=suggestion.model_dump(mode="json")
+        ))
+        
+    def get_suggestion_stats(self) -> dict:
+        """Запросы подсказок: всего (включая завершенные звонки) и по активным звонкам"""
+        calls = {call_id: worker.get_stats() for call_id, worker in self.suggestion_workers.items()}
+        totals = dict(self.suggestion_totals)
+        for stats in calls.values():
+            for key in totals:
+                totals[key] += stats[key]
+        return {
+            **totals,
+            "rule_suggestions": self.rule_suggestions,
+            "rule_skipped_llm": self.rule_skipped_llm,
+            "calls": calls,
+        }
+    
+    def get_audio_stats(self) -> dict:
+        """Память аудио буферов и потери кадров (20 мс) по звонкам"""
+        calls = {}
+        buffered = 0
+        for call_id, buffers in self.audio_buffers.items():
+            calls[call_id] = {
+                speaker: {
+                    "dropped_frames": -(-buffer.dropped_bytes // FRAME_BYTES),
+                    "buffered_ms": len(buffer) * 1000 // (SAMPLE_RATE * BYTES_PER_SAMPLE),
+                    "high_water_ms": buffer.high_water_mark * 1000 // (SAMPLE_RATE * BYTES_PER_SAMPLE),
+                }
+                for speaker, buffer in buffers.items()
+            }
+            buffered += sum(len(buffer) for buffer in buffers.values())
+        
+        return {
+            "policy": settings.audio_budget_policy,
+            "budget_mb": round(self.audio_budget.limit_bytes / 1024 / 1024, 1),
+            "allocated_mb": round(self.audio_budget.allocated_bytes / 1024 / 1024, 1),
+            "buffered_mb": round(buffered / 1024 / 1024, 2),
+            "rejected_calls": self.rejected_audio_calls,
+            "dropped_frames_total": self.dropped_frames_total,
+            "dsp": dsp_pool.get_stats() if dsp_pool is not None else None,
+            "line_states": {
+                f"{call_id}/{speaker}": state for (call_id, speaker), state in self.line_states.items()
+            },
+            "stt_streams": {
+                call_id: {speaker: session.get_stats() for speaker, session in sessions.items()}
+                for call_id, sessions in self.stt_sessions.items()
+            },
+            "calls": calls,
+        }
     
     def get_active_calls(self) -> List[Call]:
         """Возвращает список активных звонков"""
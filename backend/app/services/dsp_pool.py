@@ -0,0 +1,332 @@
+"""Обработка аудио (decode → resample → VAD) в пуле процессов через разделяемую память"""
+import asyncio
+import itertools
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ..config import get_settings
+from .audio_codec import get_codec
+from .audio_pipeline import AudioPipeline
+from .rtp import StreamKey
+from .line_classifier import LineClassifier
+from .vad import SpeechGate, VoiceActivityDetector, load_vad_model
+
+settings = get_settings()
+
+# Во сколько раз PCM на выходе может быть больше payload (G.711 8 кГц → slin 16 кГц)
+OUTPUT_EXPANSION = 4
+# Запас выходного слота под pre-roll VAD, который выдается вместе с началом речи
+PREROLL_MARGIN = 64 * 1024
+
+# sink(pcm, events) вызывается, пока слот занят: pcm нужно скопировать до возврата
+ResultSink = Callable[[memoryview, List[str]], None]
+
+
+def _dsp_worker(
+    conn,
+    input_name: str,
+    output_name: str,
+    slot_size: int,
+    output_slot_size: int,
+    sample_rate: int,
+    vad_model_path: str
+):
+    """Цикл процесса-воркера DSP"""
+    shm_in = shared_memory.SharedMemory(name=input_name)
+    shm_out = shared_memory.SharedMemory(name=output_name)
+    model = load_vad_model(vad_model_path, sample_rate) if vad_model_path else None
+    chains: Dict[int, Tuple[AudioPipeline, Optional[LineClassifier], Optional[SpeechGate]]] = {}
+
+    try:
+        while True:
+            try:
+                command, *args = conn.recv()
+            except EOFError:
+                return
+            if command == "stop":
+                return
+
+            if command == "open":
+                stream_id, media_format, hangover_frames, line_options, pipeline_options = args
+                gate = None
+                if hangover_frames is not None:
+                    gate = SpeechGate(VoiceActivityDetector(
+                        sample_rate=sample_rate,
+                        hangover_frames=hangover_frames,
+                        model=model
+                    ))
+                classifier = LineClassifier(sample_rate, **line_options) if line_options is not None else None
+                pipeline = AudioPipeline(media_format, sample_rate, **(pipeline_options or {}))
+                chains[stream_id] = (pipeline, classifier, gate)
+            elif command == "close":
+                chains.pop(args[0], None)
+            elif command == "process":
+                request_id, stream_id, slot, size = args
+                chain = chains.get(stream_id)
+                if chain is None:
+                    conn.send(("done", request_id, 0, []))
+                    continue
+                pipeline, classifier, gate = chain
+                try:
+                    start = slot * slot_size
+                    pcm = pipeline.process(shm_in.buf[start:start + size])
+                    events: List[str] = []
+                    if classifier is not None:
+                        events.extend(classifier.process(pcm))
+                    if gate is not None:
+                        pcm, gate_events = gate.process(pcm)
+                        events.extend(gate_events)
+                    out = pcm.view(np.uint8)
+                    length = min(len(out), output_slot_size)
+                    start = slot * output_slot_size
+                    shm_out.buf[start:start + length] = out[:length]
+                    conn.send(("done", request_id, length, events))
+                except Exception as e:
+                    conn.send(("error", request_id, str(e)))
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
+class _Worker:
+    """Процесс DSP и его сегменты разделяемой памяти (сторона event loop)"""
+
+    def __init__(self, process, conn, shm_in, shm_out, slots: int):
+        self.process = process
+        self.conn = conn
+        self.shm_in = shm_in
+        self.shm_out = shm_out
+        self.free_slots: asyncio.Queue = asyncio.Queue()
+        for slot in range(slots):
+            self.free_slots.put_nowait(slot)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.orphaned: Dict[int, int] = {}  # request_id → слот отмененного запроса
+        self.alive = True
+
+
+class DSPWorkerPool:
+    """Пул процессов DSP; поток закреплен за одним воркером, порядок кадров сохраняется"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        slots: int = 64,
+        slot_size: int = 64 * 1024,
+        sample_rate: int = settings.soniox_sample_rate,
+        vad_model_path: str = settings.vad_model
+    ):
+        self.workers = workers
+        self.slots = slots
+        self.slot_size = slot_size - slot_size % 2
+        self.output_slot_size = self.slot_size * OUTPUT_EXPANSION + PREROLL_MARGIN
+        self.sample_rate = sample_rate
+        self.vad_model_path = vad_model_path
+        self._workers: List[_Worker] = []
+        self._stream_ids: Dict[StreamKey, int] = {}
+        self._next_stream_id = 1
+        self._request_ids = itertools.count(1)
+
+        self.processed_requests = 0
+        self.slot_waits = 0
+        self.slot_wait_seconds = 0.0
+        self.truncated_results = 0
+
+    async def start(self):
+        """Запускает процессы-воркеры и выделяет разделяемую память"""
+        loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context("spawn")
+
+        for index in range(self.workers):
+            shm_in = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_size)
+            shm_out = shared_memory.SharedMemory(create=True, size=self.slots * self.output_slot_size)
+            conn, worker_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_dsp_worker,
+                args=(
+                    worker_conn, shm_in.name, shm_out.name, self.slot_size,
+                    self.output_slot_size, self.sample_rate, self.vad_model_path
+                ),
+                name=f"dsp-{index}",
+                daemon=True
+            )
+            process.start()
+            worker_conn.close()
+
+            self._workers.append(_Worker(process, conn, shm_in, shm_out, self.slots))
+            loop.add_reader(conn.fileno(), self._on_worker_output, index)
+
+        logger.info(f"DSP pool started: {self.workers} workers, {self.slots} slots x {self.slot_size} bytes")
+
+    def _shard(self, stream_id: int) -> int:
+        return stream_id % self.workers
+
+    def open_stream(
+        self,
+        key: StreamKey,
+        media_format: str,
+        hangover_frames: Optional[int] = None,
+        line_options: Optional[dict] = None,
+        pipeline_options: Optional[dict] = None
+    ):
+        """Создает цепочку потока в его воркере (hangover_frames=None — без VAD)"""
+        get_codec(media_format)  # ValueError для неподдерживаемых форматов
+        self.close_stream(key)
+        stream_id = self._next_stream_id
+        self._next_stream_id += 1
+        self._stream_ids[key] = stream_id
+        self._send(stream_id, ("open", stream_id, media_format, hangover_frames, line_options, pipeline_options))
+
+    def close_stream(self, key: StreamKey):
+        """Удаляет цепочку потока"""
+        stream_id = self._stream_ids.pop(key, None)
+        if stream_id is not None:
+            self._send(stream_id, ("close", stream_id))
+
+    def has_stream(self, key: StreamKey) -> bool:
+        return key in self._stream_ids
+
+    def _send(self, stream_id: int, command: tuple) -> bool:
+        worker = self._workers[self._shard(stream_id)]
+        if not worker.alive:
+            return False
+        try:
+            worker.conn.send(command)
+            return True
+        except OSError as e:
+            logger.error(f"DSP worker control error: {e}")
+            return False
+
+    async def process(self, key: StreamKey, payload, sink: ResultSink):
+        """Обрабатывает payload потока; результат отдается в sink частями размером со слот"""
+        stream_id = self._stream_ids.get(key)
+        if stream_id is None:
+            return
+        worker = self._workers[self._shard(stream_id)]
+        payload = memoryview(payload).cast("B")
+
+        for offset in range(0, len(payload), self.slot_size):
+            part = payload[offset:offset + self.slot_size]
+
+            if worker.free_slots.empty():
+                self.slot_waits += 1
+                started = time.monotonic()
+                slot = await worker.free_slots.get()
+                self.slot_wait_seconds += time.monotonic() - started
+            else:
+                slot = worker.free_slots.get_nowait()
+
+            release = True
+            try:
+                start = slot * self.slot_size
+                worker.shm_in.buf[start:start + len(part)] = part
+
+                request_id = next(self._request_ids)
+                future = asyncio.get_running_loop().create_future()
+                worker.pending[request_id] = future
+                if not self._send(stream_id, ("process", request_id, stream_id, slot, len(part))):
+                    worker.pending.pop(request_id, None)
+                    raise RuntimeError("DSP worker is not available")
+
+                try:
+                    length, events = await future
+                except asyncio.CancelledError:
+                    # Воркер еще работает со слотом: освободим его, когда придет ответ
+                    if worker.alive and request_id in worker.pending:
+                        worker.orphaned[request_id] = slot
+                        release = False
+                    raise
+                self.processed_requests += 1
+                if length == self.output_slot_size:
+                    self.truncated_results += 1
+                start = slot * self.output_slot_size
+                sink(worker.shm_out.buf[start:start + length], events)
+            finally:
+                if release:
+                    worker.free_slots.put_nowait(slot)
+
+    def _on_worker_output(self, index: int):
+        """Разбирает ответы воркера и будит ожидающие запросы"""
+        worker = self._workers[index]
+        try:
+            while worker.conn.poll():
+                status, request_id, *result = worker.conn.recv()
+                slot = worker.orphaned.pop(request_id, None)
+                if slot is not None:
+                    worker.free_slots.put_nowait(slot)
+                future = worker.pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if status == "done":
+                    future.set_result(tuple(result))
+                else:
+                    future.set_exception(RuntimeError(result[0]))
+        except (EOFError, OSError):
+            logger.error(f"DSP worker {index} exited")
+            self._fail_worker(index)
+
+    def _fail_worker(self, index: int):
+        worker = self._workers[index]
+        worker.alive = False
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("DSP worker exited"))
+        worker.pending.clear()
+
+    def get_stats(self) -> dict:
+        """Загрузка пула"""
+        return {
+            "workers": sum(1 for w in self._workers if w.process.is_alive()),
+            "streams": len(self._stream_ids),
+            "in_flight": sum(len(w.pending) for w in self._workers),
+            "processed_requests": self.processed_requests,
+            "slot_waits": self.slot_waits,
+            "slot_wait_ms": round(self.slot_wait_seconds * 1000, 1),
+            "truncated_results": self.truncated_results,
+        }
+
+    async def stop(self):
+        """Останавливает воркеры и освобождает разделяемую память"""
+        loop = asyncio.get_running_loop()
+        for index, worker in enumerate(self._workers):
+            if worker.alive:
+                loop.remove_reader(worker.conn.fileno())
+                try:
+                    worker.conn.send(("stop",))
+                except OSError:
+                    pass
+            worker.alive = False
+            for future in worker.pending.values():
+                if not future.done():
+                    future.cancel()
+
+        for worker in self._workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.shm_in.close()
+            worker.shm_in.unlink()
+            worker.shm_out.close()
+            worker.shm_out.unlink()
+
+        self._workers.clear()
+        self._stream_ids.clear()
+
+
+# Глобальный экземпляр: None — DSP выполняется в event loop.
+# Пул обслуживает только RTP звонков (CallManager.attach_media)
+dsp_pool: Optional[DSPWorkerPool] = (
+    DSPWorkerPool(
+        workers=settings.dsp_workers,
+        slots=settings.dsp_slots_per_worker,
+        slot_size=settings.dsp_slot_kb * 1024
+    )
+    if settings.dsp_workers > 0 and settings.realtime_media_enabled
+    else None
+)
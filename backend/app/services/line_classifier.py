@@ -0,0 +1,278 @@
+"""Распознавание музыки ожидания и автоответчика на стороне звонка"""
+from collections import deque
+from typing import List
+
+import numpy as np
+
+# События классификатора (передаются вместе с событиями VAD)
+ON_HOLD = "on_hold"
+MACHINE_DETECTED = "machine_detected"
+LIVE_SPEECH = "live_speech"
+LINE_EVENTS = (ON_HOLD, MACHINE_DETECTED, LIVE_SPEECH)
+
+# Состояния стороны
+LIVE = "live"
+HOLD = "hold"
+MACHINE = "machine"
+
+
+class LineClassifier:
+    """
+    Живая речь, музыка ожидания или автоответчик (detect_machine, только исходящие).
+    Из MACHINE сторона выходит после сигнала, короткой реплики после паузы или по machine_max_ms
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        detect_machine: bool = False,
+        frame_ms: int = 20,
+        window_ms: int = 3000,
+        periodicity_ms: int = 6000,
+        hop_ms: int = 500,
+        min_energy_db: float = -50.0,
+        voice_margin_db: float = 12.0,
+        music_voiced_ratio: float = 0.95,
+        music_flatness: float = 0.08,
+        music_periodicity: float = 0.5,
+        hold_ms: int = 5000,
+        resume_ms: int = 1500,
+        tone_ratio: float = 0.8,
+        beep_min_ms: int = 200,
+        beep_max_ms: int = 2000,
+        greeting_ms: int = 2500,
+        greeting_gap_ms: int = 800,
+        machine_window_ms: int = 30000,
+        reply_pause_ms: int = 1000,
+        reply_min_ms: int = 200,
+        reply_max_ms: int = 2000,
+        machine_max_ms: int = 45000
+    ):
+        self.sample_rate = sample_rate
+        self.detect_machine = detect_machine
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.frame_ms = frame_ms
+        self.min_energy_db = min_energy_db
+        self.voice_margin_db = voice_margin_db
+        self.music_voiced_ratio = music_voiced_ratio
+        self.music_flatness = music_flatness
+        self.music_periodicity = music_periodicity
+        self.tone_ratio = tone_ratio
+
+        def frames(ms: int) -> int:
+            return max(1, ms // frame_ms)
+
+        self.window = frames(window_ms)
+        self.hop = frames(hop_ms)
+        self.hold_hops = max(1, hold_ms // hop_ms)
+        self.resume_hops = max(1, resume_ms // hop_ms)
+        self.beep_min = frames(beep_min_ms)
+        self.beep_max = frames(beep_max_ms)
+        self.greeting_frames = frames(greeting_ms)
+        self.greeting_gap = frames(greeting_gap_ms)
+        self.machine_window = frames(machine_window_ms)
+        self.reply_pause = frames(reply_pause_ms)
+        self.reply_min = frames(reply_min_ms)
+        self.reply_max = frames(reply_max_ms)
+        self.machine_max = frames(machine_max_ms)
+
+        freqs = np.fft.rfftfreq(self.frame_len, 1.0 / sample_rate)
+        self._band = (freqs >= 300) & (freqs <= 3400)
+        self._band_freqs = freqs[self._band]
+        self._hann = np.hanning(self.frame_len).astype(np.float32)
+
+        self.state = LIVE
+        self.noise_db = min_energy_db
+        self._remainder = np.empty(0, dtype=np.int16)
+        self._voiced: deque = deque(maxlen=frames(periodicity_ms))
+        self._energy: deque = deque(maxlen=frames(periodicity_ms))
+        self._flatness: deque = deque(maxlen=self.window)
+        self._frames = 0  # кадров с начала потока
+        self._until_hop = self.hop
+        self._music_hops = 0
+        self._speech_hops = 0
+
+        # Тональный сигнал и приветствие (автоответчик)
+        self._tone_bin = -1
+        self._tone_run = 0
+        self._beep_heard = False
+        self._greeting_run = 0
+        self._greeting_gap = 0
+        self._greeting_done = not detect_machine
+        
+        # Выход из MACHINE без сигнала
+        self._machine_frames = 0
+        self._silence_run = 0
+        self._reply = None  # кадров речи в реплике после паузы; None — реплики нет
+        self._reply_gap = 0
+
+    def process(self, pcm: np.ndarray) -> List[str]:
+        """Добавляет PCM и возвращает события смены состояния"""
+        if len(self._remainder):
+            pcm = np.concatenate((self._remainder, pcm))
+        n_frames = len(pcm) // self.frame_len
+        self._remainder = pcm[n_frames * self.frame_len:].copy()
+        if n_frames == 0:
+            return []
+        frames = pcm[:n_frames * self.frame_len].reshape(n_frames, self.frame_len).astype(np.float32)
+
+        energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) / (32768.0 ** 2) + 1e-12)
+        power = np.abs(np.fft.rfft(frames * self._hann, axis=1)) ** 2
+        band = power[:, self._band] + 1e-9
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+        # Доля энергии полосы в пике (с соседними бинами — тон между бинами)
+        peak = np.argmax(band, axis=1)
+        padded = np.pad(band, ((0, 0), (1, 1)))
+        rows = np.arange(n_frames)
+        tone = (padded[rows, peak] + padded[rows, peak + 1] + padded[rows, peak + 2]) / np.sum(band, axis=1)
+
+        events: List[str] = []
+        for i in range(n_frames):
+            level = float(energy_db[i])
+            # Уровень шума: сразу вниз, медленно вверх (музыка без пауз его не поднимает)
+            self.noise_db = level if level < self.noise_db else self.noise_db + 0.01
+            voiced = level > max(self.noise_db + self.voice_margin_db, self.min_energy_db)
+
+            self._voiced.append(voiced)
+            self._energy.append(level)
+            if voiced:
+                self._flatness.append(float(flatness[i]))
+            self._frames += 1
+
+            if self.detect_machine:
+                is_tone = bool(tone[i] >= self.tone_ratio)
+                self._track_machine(voiced, is_tone, int(peak[i]), events)
+                if self.state == MACHINE:
+                    self._track_reply(voiced, is_tone, events)
+
+            self._until_hop -= 1
+            if self._until_hop == 0:
+                self._until_hop = self.hop
+                self._decide(events)
+        return events
+
+    def _track_machine(self, voiced: bool, is_tone: bool, peak: int, events: List[str]):
+        """Тональный сигнал автоответчика и длина первого приветствия"""
+        in_window = self._frames <= self.machine_window
+        tone_bin = peak if voiced and is_tone and 300 <= self._band_freqs[peak] <= 3000 else -1
+        if tone_bin >= 0 and abs(tone_bin - self._tone_bin) <= 1:
+            self._tone_run += 1
+        else:
+            if self.beep_min <= self._tone_run <= self.beep_max and (in_window or self.state == MACHINE):
+                # Сигнал закончился: дальше записывается сообщение
+                self._beep_heard = True
+                self._speech_hops = 0
+                # Речь до сигнала — приветствие: окно решения начинается заново
+                self._voiced.clear()
+                self._energy.clear()
+                self._flatness.clear()
+                self._set_state(MACHINE, MACHINE_DETECTED, events)
+            self._tone_run = 1 if tone_bin >= 0 else 0
+        self._tone_bin = tone_bin
+
+        if self._greeting_done:
+            return
+        if not in_window:
+            self._greeting_done = True
+        elif voiced:
+            self._greeting_run += 1 + self._greeting_gap
+            self._greeting_gap = 0
+            if self._greeting_run >= self.greeting_frames:
+                self._greeting_done = True
+                self._set_state(MACHINE, MACHINE_DETECTED, events)
+        elif self._greeting_run:
+            self._greeting_gap += 1
+            if self._greeting_gap >= self.greeting_gap:
+                # Короткое "Алло?" и пауза — отвечает человек
+                self._greeting_done = True
+
+    def _track_reply(self, voiced: bool, is_tone: bool, events: List[str]):
+        """Короткая реплика после паузы или предел времени в MACHINE — сторона живая"""
+        self._machine_frames += 1
+        if self._machine_frames >= self.machine_max:
+            self._set_state(LIVE, LIVE_SPEECH, events)
+            return
+        if self._beep_heard:
+            # После сигнала сторону возвращает речь (_decide)
+            return
+        
+        if voiced and not is_tone:
+            if self._reply is None and self._silence_run >= self.reply_pause:
+                self._reply = 0
+            if self._reply is not None:
+                self._reply += 1 + self._reply_gap
+                self._reply_gap = 0
+                if self._reply > self.reply_max:
+                    # Длинная речь без паузы — продолжается приветствие
+                    self._reply = None
+            self._silence_run = 0
+        elif voiced:
+            # Тон — возможно сигнал автоответчика, не реплика
+            self._reply = None
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+            if self._reply is not None:
+                self._reply_gap += 1
+                if self._reply_gap >= self.greeting_gap:
+                    if self._reply >= self.reply_min:
+                        self._set_state(LIVE, LIVE_SPEECH, events)
+                    self._reply = None
+                    self._reply_gap = 0
+        
+    def _periodicity(self) -> float:
+        """Максимум автокорреляции огибающей на лагах 0.25–2 с (ритм музыки)"""
+        envelope = np.fromiter(self._energy, dtype=np.float32)
+        min_lag = 250 // self.frame_ms
+        max_lag = min(2000 // self.frame_ms, len(envelope) // 2)
+        if max_lag <= min_lag:
+            return 0.0
+        envelope -= envelope.mean()
+        variance = float(np.dot(envelope, envelope))
+        if variance < 1e-6:
+            return 0.0
+        spectrum = np.fft.rfft(envelope, 2 * len(envelope))
+        autocorr = np.fft.irfft(spectrum * np.conj(spectrum))[:max_lag + 1] / variance
+        return float(np.max(autocorr[min_lag:max_lag + 1]))
+
+    def _decide(self, events: List[str]):
+        if len(self._voiced) < self.window:
+            return
+        recent = list(self._voiced)[-self.window:]
+        voiced_ratio = sum(recent) / self.window
+        music = voiced_ratio >= self.music_voiced_ratio and (
+            (self._flatness and float(np.median(self._flatness)) < self.music_flatness)
+            or self._periodicity() >= self.music_periodicity
+        )
+        speech = not music and 0.2 <= voiced_ratio < self.music_voiced_ratio
+
+        self._music_hops = self._music_hops + 1 if music else 0
+        self._speech_hops = self._speech_hops + 1 if speech else 0
+
+        if self.state == LIVE and self._music_hops >= self.hold_hops:
+            self._set_state(HOLD, ON_HOLD, events)
+        elif self._speech_hops >= self.resume_hops and (
+            self.state == HOLD or (self.state == MACHINE and self._beep_heard)
+        ):
+            self._set_state(LIVE, LIVE_SPEECH, events)
+
+    def _set_state(self, state: str, event: str, events: List[str]):
+        if self.state == state:
+            return
+        if state == MACHINE and not self.detect_machine:
+            # Автоответчик — только для исходящих звонков (detect_machine)
+            return
+        self.state = state
+        self._music_hops = self._speech_hops = 0
+        if state == MACHINE:
+            self._machine_frames = 0
+            self._silence_run = 0
+            self._reply = None
+            self._reply_gap = 0
+        events.append(event)
+
+    @property
+    def suspended(self) -> bool:
+        """Сторону не нужно транскрибировать"""
+        return self.state != LIVE
+
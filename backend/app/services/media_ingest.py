@@ -0,0 +1,317 @@
+"""Прием RTP в нескольких процессах (SO_REUSEPORT или диапазон портов) с пакетным чтением сокета"""
+import asyncio
+import json
+import multiprocessing
+import selectors
+import socket
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from ..config import get_settings
+from .asterisk_ari import AudioStream, AudioStreamReceiver, audio_receiver
+from .audio_codec import get_codec
+from .rtp import RTP_HEADER_SIZE, Address, JitterBuffer, RTPDemux, StreamKey, parse_rtp
+
+settings = get_settings()
+
+# Кадр в сообщении воркера: stream_id, длина payload
+FRAME_HEADER = struct.Struct("!II")
+MSG_FRAMES = b"F"
+MSG_STATS = b"S"
+
+RECV_SIZE = 2048
+SOCKET_RCVBUF = 4 * 1024 * 1024
+
+
+def _bind_socket(host: str, port: int, reuseport: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    return sock
+
+
+def _ingest_worker(
+    host: str,
+    port: int,
+    reuseport: bool,
+    control,
+    output,
+    batch_size: int,
+    stats_interval: float
+):
+    """Цикл процесса-воркера приема RTP"""
+    sock = _bind_socket(host, port, reuseport)
+    demux = RTPDemux()
+    stream_ids: Dict[StreamKey, int] = {}
+    buffers: Dict[int, JitterBuffer] = {}
+
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    selector.register(control, selectors.EVENT_READ)
+    next_stats = time.monotonic() + stats_interval
+
+    while True:
+        for key, _ in selector.select(timeout=stats_interval):
+            if key.fileobj is control:
+                command, *args = control.recv()
+                if command == "stop":
+                    sock.close()
+                    return
+                if command == "register":
+                    stream_id, stream_key, remote_addr, ssrc, media_format = args
+                    codec = get_codec(media_format)
+                    demux.register(stream_key, remote_addr=remote_addr, ssrc=ssrc)
+                    stream_ids[stream_key] = stream_id
+                    buffers[stream_id] = JitterBuffer(
+                        clock_rate=codec.sample_rate,
+                        bytes_per_sample=codec.bytes_per_sample,
+                        silence_byte=codec.silence_byte
+                    )
+                elif command == "unregister":
+                    stream_id, stream_key = args
+                    demux.unregister(stream_key)
+                    stream_ids.pop(stream_key, None)
+                    buffers.pop(stream_id, None)
+                continue
+
+            # Пачка датаграмм за одно пробуждение
+            out = bytearray(MSG_FRAMES)
+            for _ in range(batch_size):
+                try:
+                    data, addr = sock.recvfrom(RECV_SIZE)
+                except BlockingIOError:
+                    break
+                if len(data) <= RTP_HEADER_SIZE:
+                    continue
+                packet = parse_rtp(data)
+                if packet is None:
+                    continue
+                stream_key = demux.resolve(packet.ssrc, addr)
+                stream_id = stream_ids.get(stream_key) if stream_key else None
+                if stream_id is None:
+                    continue
+                for payload in buffers[stream_id].push(packet):
+                    out += FRAME_HEADER.pack(stream_id, len(payload))
+                    out += payload
+            if len(out) > 1:
+                output.send_bytes(out)
+
+        now = time.monotonic()
+        if now >= next_stats:
+            next_stats = now + stats_interval
+            stats = {str(stream_id): jb.get_stats() for stream_id, jb in buffers.items()}
+            stats["unknown_packets"] = demux.unknown_packets
+            output.send_bytes(MSG_STATS + json.dumps(stats).encode())
+
+
+class MediaIngestPool(AudioStreamReceiver):
+    """
+    Прием RTP в N процессах-воркерах.
+    Интерфейс совпадает с AudioStreamReceiver: основной процесс только
+    раскладывает готовые кадры по очередям потоков
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8001,
+        workers: int = 2,
+        reuseport: bool = False,
+        batch_size: int = 64,
+        stats_interval: float = 1.0,
+        queue_size: int = 250
+    ):
+        super().__init__(host=host, port=port, queue_size=queue_size)
+        self.workers = workers
+        self.reuseport = reuseport
+        self.batch_size = batch_size
+        self.stats_interval = stats_interval
+        self._processes: List[multiprocessing.Process] = []
+        self._controls: list = []
+        self._outputs: list = []
+        self._stream_ids: Dict[StreamKey, int] = {}
+        self._streams_by_id: Dict[int, AudioStream] = {}
+        self._next_stream_id = 1
+        self._unknown_packets: List[int] = []
+
+    async def start(self):
+        """Запускает процессы-воркеры"""
+        loop = asyncio.get_running_loop()
+        ctx = multiprocessing.get_context("spawn")
+
+        for index in range(self.workers):
+            control, worker_control = ctx.Pipe()
+            output, worker_output = ctx.Pipe(duplex=False)
+            port = self.port if self.reuseport else self.port + index
+
+            process = ctx.Process(
+                target=_ingest_worker,
+                args=(
+                    self.host, port, self.reuseport, worker_control, worker_output,
+                    self.batch_size, self.stats_interval
+                ),
+                name=f"rtp-ingest-{index}",
+                daemon=True
+            )
+            process.start()
+            worker_control.close()
+            worker_output.close()
+
+            self._processes.append(process)
+            self._controls.append(control)
+            self._outputs.append(output)
+            self._unknown_packets.append(0)
+            loop.add_reader(output.fileno(), self._on_worker_output, index)
+
+        mode = f"port {self.port} (SO_REUSEPORT)" if self.reuseport else \
+            f"ports {self.port}-{self.port + self.workers - 1}"
+        logger.info(f"RTP ingest started: {self.workers} workers on {self.host}, {mode}")
+
+    def _shard(self, call_id: str) -> int:
+        return zlib.crc32(call_id.encode()) % self.workers
+
+    def get_local_port(self, call_id: str) -> int:
+        """UDP порт воркера, который обслуживает звонок"""
+        if self.reuseport:
+            return self.port
+        return self.port + self._shard(call_id)
+
+    def register_stream(
+        self,
+        call_id: str,
+        speaker: str,
+        callback,
+        remote_addr: Optional[Address] = None,
+        ssrc: Optional[int] = None,
+        media_format: str = "slin16"
+    ) -> AudioStream:
+        """
+        Регистрирует поток во воркере звонка.
+        В режиме SO_REUSEPORT источник может попасть в любой воркер,
+        поэтому адрес или SSRC обязательны
+        """
+        if self.reuseport and remote_addr is None and ssrc is None:
+            raise ValueError("remote_addr or ssrc is required in SO_REUSEPORT mode")
+        get_codec(media_format)  # ValueError для неподдерживаемых форматов
+
+        key = (call_id, speaker)
+        if key in self.streams:
+            self.unregister_stream(call_id, speaker)
+
+        stream_id = self._next_stream_id
+        self._next_stream_id += 1
+
+        stream = AudioStream(call_id, speaker, callback, self.queue_size)
+        self.streams[key] = stream
+        self._stream_ids[key] = stream_id
+        self._streams_by_id[stream_id] = stream
+
+        self._send_control(
+            call_id, ("register", stream_id, key, remote_addr, ssrc, media_format)
+        )
+
+        stream.task = asyncio.create_task(self._pump(stream))
+        return stream
+
+    def unregister_stream(self, call_id: str, speaker: str):
+        """Удаляет поток"""
+        key = (call_id, speaker)
+        stream = self.streams.pop(key, None)
+        stream_id = self._stream_ids.pop(key, None)
+        if stream_id is not None:
+            self._streams_by_id.pop(stream_id, None)
+            self._send_control(call_id, ("unregister", stream_id, key))
+        if stream and stream.task:
+            stream.task.cancel()
+
+    def _send_control(self, call_id: str, command: tuple):
+        """Отправляет команду воркеру звонка (всем воркерам в режиме SO_REUSEPORT)"""
+        controls = self._controls if self.reuseport else [self._controls[self._shard(call_id)]]
+        for control in controls:
+            try:
+                control.send(command)
+            except OSError as e:
+                logger.error(f"RTP ingest worker control error: {e}")
+
+    def _on_worker_output(self, index: int):
+        """Читает сообщения воркера и раскладывает кадры по очередям потоков"""
+        output = self._outputs[index]
+        try:
+            while output.poll():
+                message = output.recv_bytes()
+                if message[:1] == MSG_FRAMES:
+                    self._dispatch_frames(memoryview(message))
+                else:
+                    self._apply_stats(index, json.loads(message[1:]))
+        except (EOFError, OSError):
+            logger.error(f"RTP ingest worker {index} exited")
+            asyncio.get_running_loop().remove_reader(output.fileno())
+
+    def _dispatch_frames(self, message: memoryview):
+        offset = 1
+        while offset < len(message):
+            stream_id, size = FRAME_HEADER.unpack_from(message, offset)
+            offset += FRAME_HEADER.size
+            stream = self._streams_by_id.get(stream_id)
+            if stream is not None:
+                try:
+                    stream.queue.put_nowait(message[offset:offset + size])
+                except asyncio.QueueFull:
+                    stream.dropped_packets += 1
+            offset += size
+
+    def _apply_stats(self, index: int, stats: dict):
+        self._unknown_packets[index] = stats.pop("unknown_packets", 0)
+        for stream_id, stream_stats in stats.items():
+            stream = self._streams_by_id.get(int(stream_id))
+            if stream is not None:
+                stream.remote_stats[index] = stream_stats
+
+    def get_stats(self) -> dict:
+        """Счетчики приема по всем воркерам"""
+        stats = super().get_stats()
+        stats["unknown_packets"] = sum(self._unknown_packets)
+        stats["workers"] = sum(1 for p in self._processes if p.is_alive())
+        return stats
+
+    async def stop(self):
+        """Останавливает воркеры"""
+        for call_id, speaker in list(self.streams):
+            self.unregister_stream(call_id, speaker)
+
+        loop = asyncio.get_running_loop()
+        for control, output in zip(self._controls, self._outputs):
+            loop.remove_reader(output.fileno())
+            try:
+                control.send(("stop",))
+            except OSError:
+                pass
+
+        for process in self._processes:
+            await asyncio.to_thread(process.join, 5)
+            if process.is_alive():
+                process.terminate()
+
+        self._processes.clear()
+        self._controls.clear()
+        self._outputs.clear()
+        self._unknown_packets.clear()
+
+
+# Глобальный экземпляр: пул воркеров, если включен, иначе прием в event loop
+media_receiver: AudioStreamReceiver = (
+    MediaIngestPool(
+        workers=settings.media_ingest_workers,
+        reuseport=settings.media_ingest_reuseport,
+        batch_size=settings.media_ingest_batch_size
+    )
+    if settings.media_ingest_workers > 0
+    else audio_receiver
+)
@@ -0,0 +1,248 @@
+"""
+Мгновенные подсказки по возражениям клиента без запроса к LLM.
+
+patterns сравниваются с основами слов (легкий стеммер), forms — с текстом
+без стемминга и с пунктуацией; examples/negative_examples — самопроверка.
+Правила компании — Company.settings["objection_rules"]:
+    [{"id": "expensive", "patterns": ["не по карману"],
+      "forms": ["дорог(о|ой|ая)"], "exclude": ["не дорого"],
+      "examples": ["это дорого"], "negative_examples": ["по дороге"],
+      "type": "objection", "title": "...",
+      "content": "...", "priority": "high", "confidence": 0.9,
+      "speaker": "client"}]
+Встроенные правила выключаются ключом objection_default_rules.
+"""
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+from ..schemas.events import Suggestion, TranscriptSegment
+
+# Окончания от длинных к коротким; основа не короче MIN_STEM
+_REFLEXIVE = ("ся", "сь")
+_ENDINGS = tuple(sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ете", "ишь", "ите",
+    "ает", "яет", "ают", "яют", "ует", "уют", "ать", "ять", "ить", "еть", "уть", "ала", "яла",
+    "ила", "ало", "или", "али", "ый", "ий", "ой", "ая", "яя", "ое", "ее", "ые", "ие", "ую", "юю",
+    "ам", "ям", "ах", "ях", "ом", "ем", "ов", "ев", "ей", "ью", "ть", "ти", "ет", "ит", "ут", "ют",
+    "ат", "ят", "ил", "ал", "ла", "ло", "ли", "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+), key=len, reverse=True))
+MIN_STEM = 4
+
+_WORD = re.compile(r"[а-яa-z0-9]+")
+_PATTERN_WORD = re.compile(r"(?<![\\\w])[а-яa-z]+")
+
+DEFAULT_RULES = [
+    {
+        "id": "expensive",
+        "patterns": ["не по карману", "дешевле"],
+        "forms": [
+            # Основа "дорог" общая с "дорога": только формы "дорогой"/"дорого"
+            r"дорог(о|оват[оаыйяе]*|ой|ая|ое|ие|ую|ого|их|им|ими)",
+            "дороже",
+            # "Нет, денег хватает" — не возражение: запятая и продолжение проверяются
+            r"нет\s+(денег|бюджета)(?!\s+(хватает|есть))",
+            r"(денег|бюджета)\s+нет",
+        ],
+        "exclude": ["не дорого", "недорого", "не так дорого"],
+        "examples": [
+            "Это дорого", "Дороговато для нас", "Слишком дорогой тариф", "У вас дороже",
+            "Нет денег", "Сейчас нет бюджета", "Денег нет",
+        ],
+        "negative_examples": [
+            "Дорога плохая", "Я по дороге домой", "Это недорого", "Вы на дороге?",
+            "Нет, денег хватает", "Нет, бюджет есть", "Нет денег хватает",
+        ],
+        "type": "objection",
+        "title": "Возражение: дорого",
+        "content": "Предложите рассрочку или скидку 10% для новых клиентов. Сравните стоимость с конкурентами.",
+        "priority": "high",
+        "confidence": 0.9,
+    },
+    {
+        "id": "think",
+        "patterns": ["подумаю", "нужно подумать", "надо подумать", "посоветуюсь", "перезвоню"],
+        "examples": ["Я подумаю", "Надо подумать", "Перезвоню вам завтра"],
+        "type": "objection",
+        "title": "Возражение: подумаю",
+        "content": "Уточните, что именно смущает. Предложите тестовый период 14 дней без обязательств.",
+        "priority": "medium",
+        "confidence": 0.85,
+    },
+    {
+        "id": "has_provider",
+        "patterns": ["уже есть оператор", "уже есть (провайдер|связь)", "нас (все|всё) устраивает", "работаем с другим"],
+        "examples": ["У нас уже есть оператор", "Нас всё устраивает"],
+        "type": "objection",
+        "title": "Возражение: уже есть оператор",
+        "content": "Спросите, что нравится в текущем операторе и чего не хватает. Предложите сравнить условия.",
+        "priority": "medium",
+        "confidence": 0.8,
+    },
+]
+
+
+def stem(word: str) -> str:
+    """Отрезает возвратную частицу и одно окончание"""
+    for suffix in _REFLEXIVE:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    for suffix in _ENDINGS:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def lower(text: str) -> str:
+    """Нижний регистр, ё → е"""
+    return text.lower().replace("ё", "е")
+
+
+def words(text: str) -> List[str]:
+    """Только слова текста в нижнем регистре"""
+    return _WORD.findall(lower(text))
+
+
+def normalize(text: str) -> str:
+    """Слова текста, каждое — основой"""
+    return " ".join(stem(word) for word in words(text))
+
+
+def _compile(patterns: List[str]) -> Optional["re.Pattern"]:
+    """
+    Слова шаблонов → основы с продолжением; короткие слова ("не", "нет")
+    совпадают только целиком. Служебные символы regex сохраняются
+    """
+    def word(match: "re.Match") -> str:
+        text = match.group()
+        return rf"\b{text}\b" if len(text) < MIN_STEM else rf"\b{stem(text)}\w*"
+
+    parts = []
+    for pattern in patterns:
+        source = pattern.lower().replace("ё", "е").strip()
+        source = _PATTERN_WORD.sub(word, source)
+        parts.append(re.sub(r"\s+", " ", source))
+    return re.compile("|".join(f"(?:{part})" for part in parts)) if parts else None
+
+
+def _compile_forms(forms: List[str]) -> Optional["re.Pattern"]:
+    """Словоформы: выражения по целым словам текста без стемминга"""
+    parts = [lower(form).strip() for form in forms]
+    return re.compile("|".join(rf"\b(?:{part})\b" for part in parts)) if parts else None
+
+
+class ObjectionRule(NamedTuple):
+    id: str
+    regex: Optional["re.Pattern"]
+    forms: Optional["re.Pattern"]
+    exclude: Optional["re.Pattern"]
+    type: str
+    title: str
+    content: str
+    priority: str
+    confidence: float
+    speaker: Optional[str]
+
+    def matches(self, text: str, stems: str) -> bool:
+        """text — реплика в нижнем регистре (lower), stems — ее слова основами (normalize)"""
+        if not ((self.regex and self.regex.search(stems)) or (self.forms and self.forms.search(text))):
+            return False
+        return not (self.exclude and self.exclude.search(stems))
+
+
+def self_check(rule: ObjectionRule, examples: List[str], negative_examples: List[str]) -> List[str]:
+    """Реплики, на которых правило ошибается"""
+    def fires(text: str) -> bool:
+        return rule.matches(lower(text), normalize(text))
+
+    return [text for text in examples if not fires(text)] + [
+        text for text in negative_examples if fires(text)
+    ]
+
+
+class ObjectionMatch(NamedTuple):
+    rule_id: str
+    confidence: float
+    suggestion: Suggestion
+
+
+def compile_rules(company_settings: dict) -> List[ObjectionRule]:
+    """Правила компании поверх встроенных; ошибочные правила пропускаются"""
+    rules: Dict[str, dict] = {}
+    if company_settings.get("objection_default_rules", True):
+        rules.update((rule["id"], rule) for rule in DEFAULT_RULES)
+    for index, rule in enumerate(company_settings.get("objection_rules") or []):
+        rules[str(rule.get("id", f"rule_{index}"))] = rule
+
+    compiled = []
+    for rule_id, rule in rules.items():
+        try:
+            regex = _compile(list(rule.get("patterns") or []))
+            forms = _compile_forms(list(rule.get("forms") or []))
+            if regex is None and forms is None:
+                continue
+            compiled_rule = ObjectionRule(
+                id=rule_id,
+                regex=regex,
+                forms=forms,
+                exclude=_compile(list(rule.get("exclude") or [])),
+                type=rule.get("type", "objection"),
+                title=rule["title"],
+                content=rule["content"],
+                priority=rule.get("priority", "medium"),
+                confidence=float(rule.get("confidence", 0.8)),
+                speaker=rule.get("speaker", "client")
+            )
+            failed = self_check(
+                compiled_rule, list(rule.get("examples") or []), list(rule.get("negative_examples") or [])
+            )
+            if failed:
+                logger.warning(f"Objection rule {rule_id} fails self-check on: {failed}")
+                continue
+            compiled.append(compiled_rule)
+        except (KeyError, TypeError, ValueError, re.error) as e:
+            logger.warning(f"Objection rule {rule_id} is invalid: {e}")
+    return compiled
+
+
+class ObjectionDetector:
+    """
+    Правила одного звонка. Правило срабатывает не чаще раза в cooldown
+    секунд, чтобы повтор возражения не засыпал оператора одной подсказкой
+    """
+
+    def __init__(self, call_id: str, rules: List[ObjectionRule], cooldown: float = 60.0):
+        self.call_id = call_id
+        self.rules = rules
+        self.cooldown = cooldown
+        self._fired: Dict[str, float] = {}
+
+    def match(self, segment: TranscriptSegment) -> List[ObjectionMatch]:
+        if not self.rules:
+            return []
+        text = lower(segment.text)
+        stems = " ".join(stem(word) for word in _WORD.findall(text))
+        now = time.monotonic()
+        matches = []
+        for rule in self.rules:
+            if rule.speaker and rule.speaker != segment.speaker:
+                continue
+            if not rule.matches(text, stems):
+                continue
+            if now - self._fired.get(rule.id, float("-inf")) < self.cooldown:
+                continue
+            self._fired[rule.id] = now
+            matches.append(ObjectionMatch(rule.id, rule.confidence, Suggestion(
+                call_id=self.call_id,
+                type=rule.type,
+                title=rule.title,
+                content=rule.content,
+                priority=rule.priority,
+                source="rules",
+                created_at=datetime.now()
+            )))
+        return matches
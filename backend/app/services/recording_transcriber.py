@@ -0,0 +1,324 @@
+"""Транскрипция записей MixMonitor (${CALL_ID}-in.wav / -out.wav) в CallSession после звонка"""
+import asyncio
+import os
+import time
+import wave
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models.call_session import CallSession
+from .transcription import transcription_service
+
+settings = get_settings()
+
+LEG_SUFFIXES = ("-in.wav", "-out.wav")
+SPEAKER_NAMES = {"operator": "Оператор", "client": "Клиент"}
+
+
+class Utterance(NamedTuple):
+    """Фраза одной стороны с началом от начала записи"""
+    start_ms: int
+    speaker: str
+    text: str
+
+
+def recording_paths(call_id: str, recordings_path: str = settings.recordings_path) -> Tuple[str, str]:
+    """Пути записей сторон звонка (in, out)"""
+    return tuple(os.path.join(recordings_path, f"{call_id}{suffix}") for suffix in LEG_SUFFIXES)
+
+
+def call_id_from_path(path: str) -> Optional[str]:
+    """CALL_ID по имени файла записи стороны"""
+    name = os.path.basename(path)
+    for suffix in LEG_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)] or None
+    return None
+
+
+def call_time(call_id: str) -> Optional[float]:
+    """Время начала звонка из UNIQUEID ("[система-]epoch.номер"), если имя в этом формате"""
+    try:
+        return float(call_id.rsplit("-", 1)[-1])
+    except ValueError:
+        return None
+
+
+def leg_speakers(direction: Optional[str]) -> Tuple[str, str]:
+    """
+    Кто говорит в записях (in, out). MixMonitor стоит на канале звонящего:
+    во входящем это клиент, в исходящем — оператор
+    """
+    if direction == "outbound":
+        return "operator", "client"
+    return "client", "operator"
+
+
+def split_utterances(words: list, speaker: str, pause_ms: int) -> List[Utterance]:
+    """Группирует слова стороны во фразы по паузам"""
+    utterances = []
+    current: List[str] = []
+    start = end = 0
+    for word in words:
+        if current and word.start_ms - end > pause_ms:
+            utterances.append(Utterance(start, speaker, ' '.join(current)))
+            current = []
+        if not current:
+            start = word.start_ms
+        current.append(word.text)
+        end = word.start_ms + word.duration_ms
+    if current:
+        utterances.append(Utterance(start, speaker, ' '.join(current)))
+    return utterances
+
+
+def format_transcript(utterances: List[Utterance]) -> str:
+    """Диалог по времени: "[мм:сс] Клиент: текст" """
+    lines = []
+    for u in sorted(utterances, key=lambda u: u.start_ms):
+        seconds = u.start_ms // 1000
+        lines.append(f"[{seconds // 60:02d}:{seconds % 60:02d}] {SPEAKER_NAMES[u.speaker]}: {u.text}")
+    return "\n".join(lines)
+
+
+def _wav_seconds(path: str) -> float:
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (OSError, wave.Error, ZeroDivisionError):
+        return 0.0
+
+
+def _load_session(call_id: str) -> Optional[Tuple[int, Optional[str], bool]]:
+    """(id, direction, уже транскрибирован) CallSession звонка"""
+    db = SessionLocal()
+    try:
+        session = db.query(CallSession).filter(CallSession.call_id == call_id).first()
+        if session is None:
+            return None
+        return session.id, session.direction, session.transcript is not None
+    finally:
+        db.close()
+
+
+def _save_transcript(session_id: int, transcript: str, recording_path: str):
+    db = SessionLocal()
+    try:
+        session = db.query(CallSession).filter(CallSession.id == session_id).first()
+        if session is not None:
+            session.transcript = transcript
+            session.recording_path = recording_path
+            db.commit()
+    finally:
+        db.close()
+
+
+def _untranscribed(call_ids: List[str]) -> List[str]:
+    """Звонки из списка, у CallSession которых еще нет транскрипта (запросы пачками)"""
+    pending = []
+    db = SessionLocal()
+    try:
+        for i in range(0, len(call_ids), 500):
+            batch = call_ids[i:i + 500]
+            rows = db.query(CallSession.call_id).filter(
+                CallSession.call_id.in_(batch),
+                CallSession.transcript.is_(None)
+            ).all()
+            pending.extend(row.call_id for row in rows)
+    finally:
+        db.close()
+    return pending
+
+
+def _pending_call_ids(recordings_path: str, settle_seconds: float) -> List[str]:
+    """Завершенные записи (обе стороны, без изменений settle_seconds), еще не транскрибированные"""
+    now = time.time()
+    candidates = []
+    with os.scandir(recordings_path) as entries:
+        for entry in entries:
+            call_id = call_id_from_path(entry.name)
+            if call_id is None or not entry.name.endswith(LEG_SUFFIXES[0]):
+                continue
+            try:
+                if now - entry.stat().st_mtime < settle_seconds:
+                    continue
+            except OSError:
+                continue
+            if os.path.exists(recording_paths(call_id, recordings_path)[1]):
+                candidates.append(call_id)
+    return _untranscribed(candidates)
+
+
+class RecordingTranscriber:
+    """
+    Очередь транскрипции записей с ограниченным пулом воркеров.
+    Звонок ставится в очередь один раз; запись, которая еще пишется
+    (менялась позже settle_seconds назад), откладывается
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        recordings_path: str = settings.recordings_path,
+        settle_seconds: float = 5.0,
+        pause_ms: int = 1000,
+        max_attempts: int = 3
+    ):
+        self.workers = workers
+        self.recordings_path = recordings_path
+        self.settle_seconds = settle_seconds
+        self.pause_ms = pause_ms
+        self.max_attempts = max_attempts
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._queued: set = set()
+        self._attempts: Dict[str, int] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.in_progress = 0
+        self.done_callbacks: List[Callable[[str], None]] = []  # звонок обработан (или отброшен)
+
+        self.processed = 0
+        self.failed = 0
+        self.unmatched = 0  # записи без CallSession
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    async def start(self):
+        """Запускает воркеры"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Recording transcriber started: {self.workers} workers, {self.recordings_path}")
+
+    async def scan(self) -> int:
+        """Полный просмотр каталога: ставит в очередь записи, оставшиеся с прошлого запуска"""
+        try:
+            call_ids = await asyncio.to_thread(_pending_call_ids, self.recordings_path, self.settle_seconds)
+        except Exception as e:
+            logger.error(f"Recordings scan failed: {e}")
+            return 0
+        for call_id in call_ids:
+            self.enqueue(call_id)
+        if call_ids:
+            logger.info(f"Recordings backlog: {len(call_ids)} calls")
+        return len(call_ids)
+
+    def enqueue(self, call_id: str, delay: float = 0.0) -> bool:
+        """Ставит звонок в очередь (повторная постановка игнорируется)"""
+        if call_id in self._queued:
+            return False
+        self._queued.add(call_id)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, call_id)
+        else:
+            self.queue.put_nowait(call_id)
+        return True
+
+    def _finish(self, call_id: str):
+        """Звонок обработан или отброшен окончательно"""
+        self._queued.discard(call_id)
+        for callback in self.done_callbacks:
+            callback(call_id)
+
+    def _requeue(self, call_id: str, delay: float):
+        self._queued.discard(call_id)
+        self.enqueue(call_id, delay)
+
+    async def _worker(self):
+        while True:
+            call_id = await self.queue.get()
+            self.in_progress += 1
+            started = time.monotonic()
+            try:
+                await self.process(call_id)
+            except Exception as e:
+                attempts = self._attempts.get(call_id, 0) + 1
+                self._attempts[call_id] = attempts
+                logger.error(f"Recording transcription failed for {call_id} (attempt {attempts}): {e}")
+                if attempts < self.max_attempts:
+                    self._requeue(call_id, self.settle_seconds * attempts)
+                    continue
+                self.failed += 1
+                self._attempts.pop(call_id, None)
+                self._finish(call_id)
+            finally:
+                self.in_progress -= 1
+                self.busy_seconds += time.monotonic() - started
+                self.queue.task_done()
+
+    def _settled(self, paths: Tuple[str, ...]) -> bool:
+        now = time.time()
+        try:
+            return all(now - os.stat(path).st_mtime >= self.settle_seconds for path in paths)
+        except FileNotFoundError:
+            return False
+
+    async def process(self, call_id: str):
+        """Транскрибирует обе стороны звонка и сохраняет диалог в CallSession"""
+        paths = recording_paths(call_id, self.recordings_path)
+        if not all(os.path.exists(path) for path in paths):
+            logger.warning(f"Recordings for {call_id} not found")
+            self._finish(call_id)
+            return
+        if not self._settled(paths):
+            # MixMonitor еще пишет файл
+            self._requeue(call_id, self.settle_seconds)
+            return
+
+        session = await asyncio.to_thread(_load_session, call_id)
+        if session is None:
+            self.unmatched += 1
+            self._finish(call_id)
+            return
+        session_id, direction, done = session
+        if done:
+            self._finish(call_id)
+            return
+
+        words_in, words_out = await asyncio.gather(
+            *(transcription_service.transcribe_recording(path) for path in paths)
+        )
+        speaker_in, speaker_out = leg_speakers(direction)
+        utterances = (
+            split_utterances(words_in, speaker_in, self.pause_ms)
+            + split_utterances(words_out, speaker_out, self.pause_ms)
+        )
+
+        mixed = os.path.join(self.recordings_path, f"{call_id}.wav")
+        await asyncio.to_thread(
+            _save_transcript,
+            session_id,
+            format_transcript(utterances),
+            mixed if os.path.exists(mixed) else paths[0]
+        )
+
+        self.processed += 1
+        self.audio_seconds += max(_wav_seconds(path) for path in paths)
+        self._attempts.pop(call_id, None)
+        self._finish(call_id)
+        logger.info(f"Recording transcribed: {call_id}, {len(utterances)} utterances")
+
+    def get_stats(self) -> dict:
+        """Очередь и пропускная способность (секунд аудио на секунду работы воркеров)"""
+        return {
+            "workers": self.workers,
+            "backlog": self.queue.qsize(),
+            "in_progress": self.in_progress,
+            "processed": self.processed,
+            "failed": self.failed,
+            "unmatched": self.unmatched,
+            "audio_hours": round(self.audio_seconds / 3600, 2),
+            "realtime_factor": round(self.audio_seconds / self.busy_seconds, 2) if self.busy_seconds else None,
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+
+# Глобальный экземпляр
+recording_transcriber = RecordingTranscriber(
+    workers=settings.recording_workers,
+    settle_seconds=settings.recording_settle_seconds
+)
@@ -0,0 +1,312 @@
+"""Отслеживание каталога записей MixMonitor (watchfiles) с курсором на диске"""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from watchfiles import Change, awatch
+
+from ..config import get_settings
+from .recording_transcriber import (
+    LEG_SUFFIXES,
+    RecordingTranscriber,
+    _untranscribed,
+    call_id_from_path,
+    call_time,
+    recording_paths,
+    recording_transcriber,
+)
+
+settings = get_settings()
+
+CURSOR_MARGIN = 600.0  # запас при просмотре после перезапуска, сек
+STALE_SECONDS = 3600.0  # вторая сторона так и не появилась — звонок забывается
+
+
+class _Leg:
+    """Наблюдаемая запись стороны"""
+    __slots__ = ("size", "closed", "changed_at")
+
+    def __init__(self):
+        self.size = -1
+        self.closed = False
+        self.changed_at = time.monotonic()
+
+
+def _is_recording(change: Change, path: str) -> bool:
+    return change != Change.deleted and path.endswith(LEG_SUFFIXES)
+
+
+def _scan_recordings(
+    recordings_path: str,
+    settle_seconds: float,
+    since: Optional[float]
+) -> Tuple[List[str], List[str]]:
+    """
+    (звонки с закрытыми и нетранскрибированными записями, записи, которые еще пишутся).
+    stat — только для звонков после since (время из имени или mtime); без since — весь каталог
+    """
+    now = time.time()
+    settled = []
+    writing = []
+    with os.scandir(recordings_path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(LEG_SUFFIXES[0]):
+                continue
+            call_id = call_id_from_path(entry.name)
+            if call_id is None:
+                continue
+            started = call_time(call_id)
+            if since is not None and started is not None and started < since:
+                continue
+            paths = recording_paths(call_id, recordings_path)
+            try:
+                mtime = entry.stat().st_mtime
+                if since is not None and started is None and mtime < since:
+                    continue
+                mtimes = [mtime] + [os.stat(path).st_mtime for path in paths[1:]]
+            except OSError:
+                continue
+            if all(now - mtime >= settle_seconds for mtime in mtimes):
+                settled.append(call_id)
+            else:
+                writing.extend(paths)
+    return _untranscribed(settled), writing
+
+
+def _load_cursor(path: str) -> Optional[float]:
+    try:
+        with open(path) as f:
+            return float(json.load(f)["watermark"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Recordings cursor {path} is unreadable: {e}")
+        return None
+
+
+def _save_cursor(path: str, watermark: float):
+    """Атомарная запись: временный файл и rename"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"watermark": watermark}, f)
+    os.replace(tmp_path, path)
+
+
+class RecordingWatcher:
+    """
+    Передает закрытые записи в RecordingTranscriber сразу после звонка.
+    Каждый звонок ставится в очередь один раз; курсор двигается, когда
+    транскрибер закончил со всеми более ранними звонками
+    """
+
+    def __init__(
+        self,
+        transcriber: RecordingTranscriber,
+        recordings_path: str = settings.recordings_path,
+        cursor_path: str = settings.recording_cursor_path,
+        settle_seconds: float = 5.0,
+        check_interval: float = 1.0
+    ):
+        self.transcriber = transcriber
+        self.recordings_path = recordings_path
+        self.cursor_path = cursor_path
+        self.settle_seconds = settle_seconds
+        self.check_interval = check_interval
+
+        self._legs: Dict[str, _Leg] = {}  # path → запись, которая еще пишется
+        self._active: Dict[str, Optional[float]] = {}  # call_id → начало звонка, пока он не обработан
+        self._inflight: set = set()  # переданы транскриберу
+        self._latest: Optional[float] = None  # начало последнего увиденного звонка
+        self.watermark: Optional[float] = None
+        self._saved: Optional[float] = None
+        self._stop = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+        self.events = 0
+        self.enqueued = 0
+        self.stale = 0
+
+    async def start(self):
+        """Догоняет записи после курсора и начинает следить за каталогом"""
+        if not os.path.isdir(self.recordings_path):
+            logger.warning(f"Recordings path {self.recordings_path} not found, watcher disabled")
+            return
+
+        self.watermark = self._saved = await asyncio.to_thread(_load_cursor, self.cursor_path)
+        self.transcriber.done_callbacks.append(self._on_done)
+        self._stop.clear()
+        # Наблюдение запускается до просмотра, чтобы не пропустить записи между ними;
+        # проверки — после, чтобы курсор не ушел вперед непросмотренных звонков
+        self._tasks = [asyncio.create_task(self._watch())]
+        await self._catch_up()
+        self._tasks.append(asyncio.create_task(self._check_loop()))
+        logger.info(f"Recording watcher started: {self.recordings_path}, cursor {self.watermark}")
+
+    async def _catch_up(self):
+        # Без курсора (первый запуск) — полный просмотр, дальше только инкрементально
+        since = self.watermark - CURSOR_MARGIN if self.watermark is not None else None
+        try:
+            settled, writing = await asyncio.to_thread(
+                _scan_recordings, self.recordings_path, self.settle_seconds, since
+            )
+        except Exception as e:
+            logger.error(f"Recordings catch-up scan failed: {e}")
+            return
+        for call_id in settled:
+            self._enqueue(call_id)
+        for path in writing:
+            self._track(path)
+        if settled or writing:
+            logger.info(f"Recordings since cursor: {len(settled)} to transcribe, {len(writing) // 2} still recording")
+
+    def _track(self, path: str):
+        leg = self._legs.get(path)
+        if leg is not None:
+            leg.closed = False
+            leg.changed_at = time.monotonic()
+            return
+        call_id = call_id_from_path(path)
+        if call_id is None:
+            return
+        self._legs[path] = _Leg()
+        self._seen(call_id)
+
+    def _seen(self, call_id: str):
+        started = call_time(call_id)
+        self._active.setdefault(call_id, started)
+        if started is not None and (self._latest is None or started > self._latest):
+            self._latest = started
+
+    async def _watch(self):
+        while not self._stop.is_set():
+            try:
+                async for changes in awatch(
+                    self.recordings_path,
+                    watch_filter=_is_recording,
+                    stop_event=self._stop,
+                    recursive=False
+                ):
+                    self.events += len(changes)
+                    for _, path in changes:
+                        self._track(path)
+            except Exception as e:
+                logger.error(f"Recordings watch error: {e}")
+                await asyncio.sleep(self.check_interval)
+
+    def _is_closed(self, path: str, leg: _Leg, now: float) -> Optional[bool]:
+        """Размер не меняется и файл не трогали settle_seconds; None — файла нет"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if stat.st_size != leg.size:
+            leg.size = stat.st_size
+            return False
+        return now - stat.st_mtime >= self.settle_seconds
+
+    def check(self):
+        """
+        Ставит в очередь звонки, у которых закрыты обе записи.
+        stat только для записей, которые еще пишутся, а не для всего каталога
+        """
+        now = time.time()
+        for path, leg in list(self._legs.items()):
+            if leg.closed:
+                continue
+            closed = self._is_closed(path, leg, now)
+            if closed is None:
+                del self._legs[path]
+            else:
+                leg.closed = closed
+
+        calls: Dict[str, List[Optional[_Leg]]] = {}
+        for path, leg in self._legs.items():
+            call_id = call_id_from_path(path)
+            legs = calls.setdefault(call_id, [None, None])
+            legs[0 if path.endswith(LEG_SUFFIXES[0]) else 1] = leg
+
+        for call_id, legs in calls.items():
+            if all(leg is not None and leg.closed for leg in legs):
+                for path in recording_paths(call_id, self.recordings_path):
+                    self._legs.pop(path, None)
+                self._enqueue(call_id)
+            elif all(leg is None or leg.closed for leg in legs) and \
+                    time.monotonic() - max(leg.changed_at for leg in legs if leg) > STALE_SECONDS:
+                # Записана только одна сторона
+                for path in recording_paths(call_id, self.recordings_path):
+                    self._legs.pop(path, None)
+                self._active.pop(call_id, None)
+                self.stale += 1
+                logger.warning(f"Recording of {call_id} has only one leg, skipped")
+
+        # Звонки, чьи файлы удалены до закрытия
+        tracked = {call_id_from_path(path) for path in self._legs}
+        for call_id in [c for c in self._active if c not in tracked and c not in self._inflight]:
+            del self._active[call_id]
+
+    def _enqueue(self, call_id: str):
+        self._seen(call_id)
+        self._inflight.add(call_id)
+        # False — звонок уже поставлен CallManager'ом при завершении
+        if self.transcriber.enqueue(call_id):
+            self.enqueued += 1
+
+    def _on_done(self, call_id: str):
+        self._active.pop(call_id, None)
+        self._inflight.discard(call_id)
+
+    def _advance(self):
+        """Курсор — начало самого раннего звонка, который еще не обработан"""
+        started = [t for t in self._active.values() if t is not None]
+        watermark = min(started) if started else self._latest
+        if watermark is not None and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+
+    async def _persist(self):
+        if self.watermark is None or self.watermark == self._saved:
+            return
+        try:
+            await asyncio.to_thread(_save_cursor, self.cursor_path, self.watermark)
+            self._saved = self.watermark
+        except OSError as e:
+            logger.error(f"Failed to save recordings cursor: {e}")
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                self.check()
+                self._advance()
+                await self._persist()
+            except Exception as e:
+                logger.error(f"Recording watcher check error: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "watching": len(self._legs),
+            "active_calls": len(self._active),
+            "events": self.events,
+            "enqueued": self.enqueued,
+            "stale": self.stale,
+            "cursor": self.watermark,
+        }
+
+    async def stop(self):
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if self._on_done in self.transcriber.done_callbacks:
+            self.transcriber.done_callbacks.remove(self._on_done)
+        await self._persist()
+
+
+# Глобальный экземпляр
+recording_watcher = RecordingWatcher(
+    recording_transcriber,
+    settle_seconds=settings.recording_settle_seconds
+)
@@ -0,0 +1,58 @@
+"""Потоковый полифазный ресемплер (NumPy)"""
+from math import gcd
+
+import numpy as np
+
+
+class StreamingResampler:
+    """Полифазный ресемплер up/down (windowed sinc, Кайзер); состояние переносится между вызовами"""
+
+    def __init__(
+        self,
+        in_rate: int,
+        out_rate: int,
+        taps_per_phase: int = 16,
+        rolloff: float = 0.9,
+        beta: float = 8.0
+    ):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.passthrough = self.up == self.down
+
+        self.taps_per_phase = taps_per_phase
+        num_taps = taps_per_phase * self.up
+        cutoff = 0.5 * rolloff / max(self.up, self.down)
+        t = np.arange(num_taps) - (num_taps - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(num_taps, beta) * self.up
+        # phases[p, k] = h[p + k * up]
+        self._phases = h.reshape(taps_per_phase, self.up).T.astype(np.float32)
+        self._taps = np.arange(taps_per_phase)
+
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        # Позиция следующего выходного отсчета во временной сетке up * in_rate
+        self._t = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Ресемплирует очередной кадр int16, возвращает int16"""
+        if self.passthrough or len(samples) == 0:
+            return samples
+
+        x = np.concatenate((self._history, samples.astype(np.float32)))
+        total = len(samples) * self.up
+        count = max(0, -(-(total - self._t) // self.down))
+
+        t = self._t + np.arange(count) * self.down
+        index = (t // self.up + self.taps_per_phase - 1)[:, None] - self._taps
+        y = np.einsum("nk,nk->n", x[index], self._phases[t % self.up])
+
+        self._t += count * self.down - total
+        self._history = x[len(x) - (self.taps_per_phase - 1):]
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16)
+
+    def reset(self):
+        """Сбрасывает состояние фильтра"""
+        self._history[:] = 0
+        self._t = 0
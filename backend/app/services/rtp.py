@@ -0,0 +1,257 @@
+"""Разбор RTP, jitter buffer и демультиплексирование потоков ExternalMedia"""
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+# (host, port) источника RTP
+Address = Tuple[str, int]
+# (call_id, speaker) — один поток = одна сторона одного звонка
+StreamKey = Tuple[str, str]
+
+RTP_HEADER_SIZE = 12
+RTP_VERSION = 2
+
+
+class RTPPacket(NamedTuple):
+    """Разобранный RTP пакет"""
+    ssrc: int
+    sequence: int
+    timestamp: int
+    payload_type: int
+    marker: bool
+    payload: bytes
+
+
+def parse_rtp(data: bytes) -> Optional[RTPPacket]:
+    """
+    Разбирает RTP пакет (RFC 3550): учитывает CSRC, расширения заголовка и padding.
+    Возвращает None для некорректных пакетов
+    """
+    if len(data) < RTP_HEADER_SIZE or data[0] >> 6 != RTP_VERSION:
+        return None
+
+    first = data[0]
+    offset = RTP_HEADER_SIZE + 4 * (first & 0x0F)
+
+    if first & 0x10:  # header extension
+        if len(data) < offset + 4:
+            return None
+        offset += 4 + 4 * int.from_bytes(data[offset + 2:offset + 4], "big")
+
+    end = len(data)
+    if first & 0x20:  # padding
+        end -= data[-1]
+
+    if offset >= end:
+        return None
+
+    return RTPPacket(
+        ssrc=int.from_bytes(data[8:12], "big"),
+        sequence=int.from_bytes(data[2:4], "big"),
+        timestamp=int.from_bytes(data[4:8], "big"),
+        payload_type=data[1] & 0x7F,
+        marker=bool(data[1] & 0x80),
+        payload=data[offset:end],
+    )
+
+
+class JitterBuffer:
+    """Адаптивный jitter buffer RTP потока: порядок по seq, глубина по jitter (RFC 3550), PLC и тишина на потерях"""
+
+    SEQ_MOD = 1 << 16
+    TS_MOD = 1 << 32
+
+    def __init__(
+        self,
+        clock_rate: int = 16000,
+        bytes_per_sample: int = 2,
+        silence_byte: int = 0,
+        min_depth: int = 2,
+        max_depth: int = 25,
+        plc_frames: int = 3,
+        max_gap_seconds: float = 1.0
+    ):
+        self.clock_rate = clock_rate
+        self.bytes_per_sample = bytes_per_sample
+        self.silence_byte = silence_byte
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.plc_frames = plc_frames
+        self.max_gap_samples = int(clock_rate * max_gap_seconds)
+        self.depth = min_depth
+
+        self._packets: Dict[int, RTPPacket] = {}
+        self._next_seq: Optional[int] = None
+        self._next_ts = 0
+        self._max_seq = 0
+        self._frame_samples = clock_rate // 50  # 20 мс до первого пакета
+        self._last_payload = b""
+        self._concealed_run = 0
+        self._transit: Optional[float] = None
+
+        # Счетчики
+        self.jitter = 0.0  # в единицах timestamp
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.concealed = 0
+
+    def push(self, packet: RTPPacket) -> List[bytes]:
+        """Добавляет пакет и возвращает payload, готовые к воспроизведению по порядку"""
+        self._update_jitter(packet)
+
+        seq = packet.sequence
+        if self._next_seq is None:
+            self._next_seq = seq
+            self._next_ts = packet.timestamp
+            self._max_seq = seq
+
+        if (seq - self._next_seq) % self.SEQ_MOD >= self.SEQ_MOD // 2:
+            self.late += 1
+            return []
+        if seq in self._packets:
+            self.duplicates += 1
+            return []
+
+        if (seq - self._max_seq) % self.SEQ_MOD >= self.SEQ_MOD // 2:
+            self.reordered += 1
+        else:
+            self._max_seq = seq
+
+        self._packets[seq] = packet
+        self.received += 1
+        return self._drain(self.depth)
+
+    def flush(self) -> List[bytes]:
+        """Отдает все удержанные пакеты (например, при завершении звонка)"""
+        return self._drain(0)
+
+    def get_stats(self) -> dict:
+        """Счетчики потерь и jitter"""
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "late": self.late,
+            "duplicates": self.duplicates,
+            "reordered": self.reordered,
+            "concealed": self.concealed,
+            "jitter_ms": round(self.jitter * 1000 / self.clock_rate, 2),
+            "depth": self.depth,
+        }
+
+    def _update_jitter(self, packet: RTPPacket):
+        """Оценка interarrival jitter (RFC 3550, 6.4.1) и пересчет глубины буфера"""
+        transit = time.monotonic() * self.clock_rate - packet.timestamp
+        if self._transit is not None:
+            d = abs(transit - self._transit)
+            # Скачки timestamp (переполнение, смена источника) не учитываем
+            if d < self.clock_rate:
+                self.jitter += (d - self.jitter) / 16
+                depth = math.ceil(3 * self.jitter / self._frame_samples)
+                self.depth = min(self.max_depth, max(self.min_depth, depth))
+        self._transit = transit
+
+    def _drain(self, depth: int) -> List[bytes]:
+        out: List[bytes] = []
+        while self._packets:
+            packet = self._packets.pop(self._next_seq, None)
+            if packet is not None:
+                self._emit(packet, out)
+                continue
+
+            if len(self._packets) <= depth:
+                break
+
+            # Ожидаемый пакет так и не пришел
+            earliest = min(self._packets, key=lambda s: (s - self._next_seq) % self.SEQ_MOD)
+            gap = (earliest - self._next_seq) % self.SEQ_MOD
+            self.lost += gap
+            if gap * self._frame_samples > self.max_gap_samples:
+                # Слишком большой разрыв — синхронизируемся заново без заполнения
+                self._next_ts = self._packets[earliest].timestamp
+            else:
+                for _ in range(gap):
+                    out.append(self._conceal())
+            self._next_seq = earliest
+        return out
+
+    def _emit(self, packet: RTPPacket, out: List[bytes]):
+        gap = (packet.timestamp - self._next_ts) % self.TS_MOD
+        if 0 < gap <= self.max_gap_samples:
+            out.append(bytes([self.silence_byte]) * (gap * self.bytes_per_sample))
+
+        samples = len(packet.payload) // self.bytes_per_sample
+        if samples:
+            self._frame_samples = samples
+        self._next_ts = (packet.timestamp + samples) % self.TS_MOD
+        self._next_seq = (packet.sequence + 1) % self.SEQ_MOD
+        self._last_payload = packet.payload
+        self._concealed_run = 0
+        out.append(packet.payload)
+
+    def _conceal(self) -> bytes:
+        """Кадр на место потерянного пакета"""
+        self.concealed += 1
+        self._concealed_run += 1
+        size = self._frame_samples * self.bytes_per_sample
+        self._next_ts = (self._next_ts + self._frame_samples) % self.TS_MOD
+
+        if self._concealed_run <= self.plc_frames and len(self._last_payload) == size:
+            return self._last_payload
+        return bytes([self.silence_byte]) * size
+
+
+class RTPDemux:
+    """Поток звонка по SSRC, затем по адресу источника; без них — первый неизвестный источник"""
+
+    def __init__(self):
+        self.by_ssrc: Dict[int, StreamKey] = {}
+        self.by_addr: Dict[Address, StreamKey] = {}
+        self.pending: Deque[StreamKey] = deque()
+        self.unknown_packets = 0
+
+    def register(
+        self,
+        key: StreamKey,
+        remote_addr: Optional[Address] = None,
+        ssrc: Optional[int] = None
+    ):
+        """Регистрирует поток"""
+        if ssrc is not None:
+            self.by_ssrc[ssrc] = key
+        if remote_addr is not None:
+            self.by_addr[remote_addr] = key
+        if ssrc is None and remote_addr is None:
+            self.pending.append(key)
+
+    def unregister(self, key: StreamKey):
+        """Удаляет все привязки потока"""
+        for mapping in (self.by_ssrc, self.by_addr):
+            for k in [k for k, v in mapping.items() if v == key]:
+                del mapping[k]
+        if key in self.pending:
+            self.pending.remove(key)
+
+    def resolve(self, ssrc: int, addr: Address) -> Optional[StreamKey]:
+        """Находит поток для пакета, запоминая SSRC и адрес при первой встрече"""
+        key = self.by_ssrc.get(ssrc)
+        if key is not None:
+            return key
+
+        key = self.by_addr.get(addr)
+        if key is None and self.pending:
+            key = self.pending.popleft()
+            self.by_addr[addr] = key
+            logger.info(f"RTP source {addr[0]}:{addr[1]} bound to {key[0]}/{key[1]}")
+
+        if key is None:
+            self.unknown_packets += 1
+            return None
+
+        self.by_ssrc[ssrc] = key
+        return key
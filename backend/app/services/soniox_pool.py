@@ -0,0 +1,128 @@
+"""Общий пул gRPC каналов Soniox"""
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+import grpc
+from loguru import logger
+from soniox.speech_service import SpeechClient
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# Коды gRPC, после которых канал считается неисправным (остальные — ошибки запроса)
+CHANNEL_ERRORS = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+
+def is_channel_error(error: Exception) -> bool:
+    """Ошибка соединения, а не конкретного запроса"""
+    code = getattr(error, "code", None)
+    return isinstance(error, grpc.RpcError) and callable(code) and code() in CHANNEL_ERRORS
+
+
+class _PooledClient:
+    """Клиент пула и его загрузка"""
+
+    def __init__(self, client: SpeechClient):
+        self.client = client
+        self.active = 0  # запросов и потоков, использующих канал
+        self.retired = False  # заменен после ошибки канала, закрывается при active == 0
+
+
+class SonioxClientPool:
+    """Пул SpeechClient для всех сервисов транскрипции; канал с ошибкой соединения заменяется"""
+
+    def __init__(self, size: int = 2, api_key: str = settings.soniox_api_key):
+        self.size = max(1, size)
+        self.api_key = api_key
+        self._clients: List[_PooledClient] = []
+        self._by_client: Dict[int, _PooledClient] = {}
+        self._lock = threading.Lock()
+
+        self.replaced_channels = 0
+        self.failed_requests = 0
+
+    def _create(self) -> _PooledClient:
+        entry = _PooledClient(SpeechClient(api_key=self.api_key))
+        self._by_client[id(entry.client)] = entry
+        return entry
+
+    def _fill(self):
+        while len(self._clients) < self.size:
+            self._clients.append(self._create())
+
+    async def start(self):
+        """Создает клиентов; gRPC соединяется при первом запросе и не блокирует запуск"""
+        with self._lock:
+            self._fill()
+        logger.info(f"Soniox pool started: {self.size} channels")
+
+    def acquire(self) -> SpeechClient:
+        """Наименее загруженный канал"""
+        with self._lock:
+            self._fill()
+            entry = min(self._clients, key=lambda e: e.active)
+            entry.active += 1
+            return entry.client
+
+    def release(self, client: SpeechClient, failed: bool = False):
+        """failed — запрос упал с ошибкой соединения: канал заменяется"""
+        with self._lock:
+            entry = self._by_client.get(id(client))
+            if entry is None:
+                return
+            entry.active = max(0, entry.active - 1)
+            if failed:
+                self.failed_requests += 1
+                self._replace(entry)
+            if entry.retired and entry.active == 0:
+                self._close(entry)
+
+    @contextmanager
+    def client(self):
+        """Канал на время одного запроса"""
+        client = self.acquire()
+        failed = False
+        try:
+            yield client
+        except Exception as e:
+            failed = is_channel_error(e)
+            raise
+        finally:
+            self.release(client, failed)
+
+    def _replace(self, entry: _PooledClient):
+        if entry not in self._clients:
+            return
+        logger.warning("Soniox channel failed, replacing it")
+        self._clients[self._clients.index(entry)] = self._create()
+        self.replaced_channels += 1
+        entry.retired = True
+
+    def _close(self, entry: _PooledClient):
+        self._by_client.pop(id(entry.client), None)
+        try:
+            entry.client.close()
+        except Exception as e:
+            logger.debug(f"Soniox channel close error: {e}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "channels": len(self._clients),
+                "active": [e.active for e in self._clients],
+                "failed_requests": self.failed_requests,
+                "replaced_channels": self.replaced_channels,
+            }
+
+    async def stop(self):
+        """Закрывает каналы"""
+        with self._lock:
+            for entry in self._clients:
+                self._close(entry)
+            self._clients.clear()
+
+
+# Глобальный экземпляр
+soniox_pool = SonioxClientPool(size=settings.soniox_pool_size)
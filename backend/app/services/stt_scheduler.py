@@ -0,0 +1,237 @@
+"""Планировщик запросов к STT: общий лимит, лимиты компаний, справедливая очередь"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ..config import get_settings
+from .transcription import PCMData, transcription_service
+
+settings = get_settings()
+
+# Порядок обслуживания сторон звонка: реплики клиента важнее для подсказок
+SPEAKER_PRIORITY = ("client", "operator")
+
+WAIT_SAMPLES = 1000  # последних ожиданий в очереди для перцентилей
+
+
+class _Job:
+    __slots__ = ("call_id", "speaker", "company_id", "company_limit", "audio", "future", "enqueued_at")
+
+    def __init__(self, call_id, speaker, company_id, company_limit, audio, future):
+        self.call_id = call_id
+        self.speaker = speaker
+        self.company_id = company_id
+        self.company_limit = company_limit
+        self.audio = audio
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class STTScheduler:
+    """Очередь запросов транскрипции: общий лимит, лимит компании, round-robin между звонками"""
+
+    def __init__(
+        self,
+        transcribe: Callable[[PCMData], Awaitable[str]],
+        max_concurrent: int = 32,
+        company_limit: int = 8,
+        max_streams: int = 200,
+        company_stream_limit: int = 40
+    ):
+        self.transcribe = transcribe
+        self.max_concurrent = max_concurrent
+        self.company_limit = company_limit
+        self.max_streams = max_streams
+        self.company_stream_limit = company_stream_limit
+
+        # call_id → очереди по приоритету сторон
+        self._queues: Dict[str, Tuple[Deque[_Job], ...]] = {}
+        self._order: Deque[str] = deque()  # звонки с ожидающими чанками, в порядке обслуживания
+        self._running = 0
+        self._company_running: Dict[Optional[int], int] = {}
+        self._tasks: set = set()
+
+        self._streams: Dict[str, Tuple[Optional[int], int]] = {}
+        self._company_streams: Dict[Optional[int], int] = {}
+
+        self._waits: Dict[str, Deque[float]] = {s: deque(maxlen=WAIT_SAMPLES) for s in SPEAKER_PRIORITY}
+        self.completed = 0
+        self.failed = 0
+        self.rejected_streams = 0
+
+    async def submit(
+        self,
+        call_id: str,
+        speaker: str,
+        audio: PCMData,
+        company_id: Optional[int] = None,
+        company_limit: Optional[int] = None
+    ) -> str:
+        """Ставит чанк в очередь и ждет текст. audio копируется сразу: view буфера может быть перезаписан"""
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(
+            call_id, speaker, company_id, company_limit or self.company_limit,
+            bytes(memoryview(audio).cast("B")), future
+        )
+        queues = self._queues.get(call_id)
+        if queues is None:
+            queues = self._queues[call_id] = tuple(deque() for _ in SPEAKER_PRIORITY)
+            self._order.append(call_id)
+        priority = SPEAKER_PRIORITY.index(speaker) if speaker in SPEAKER_PRIORITY else len(queues) - 1
+        queues[priority].append(job)
+        self._dispatch()
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._remove(job)
+            raise
+
+    def _remove(self, job: _Job):
+        """Убирает из очереди чанк, ожидание которого отменено"""
+        queues = self._queues.get(job.call_id)
+        if queues is None:
+            return
+        for jobs in queues:
+            if job in jobs:
+                jobs.remove(job)
+        if not any(queues):
+            self._drop_call(job.call_id)
+
+    def _drop_call(self, call_id: str):
+        self._queues.pop(call_id, None)
+        try:
+            self._order.remove(call_id)
+        except ValueError:
+            pass
+
+    def cancel_call(self, call_id: str):
+        """Снимает с очереди чанки завершенного звонка"""
+        for jobs in self._queues.get(call_id, ()):
+            for job in jobs:
+                job.future.cancel()
+        self._drop_call(call_id)
+
+    def _next_job(self) -> Optional[_Job]:
+        for priority in range(len(SPEAKER_PRIORITY)):
+            for index, call_id in enumerate(self._order):
+                jobs = self._queues[call_id][priority]
+                if not jobs:
+                    continue
+                job = jobs[0]
+                if self._company_running.get(job.company_id, 0) >= job.company_limit:
+                    continue
+
+                jobs.popleft()
+                # Звонок уходит в конец круга
+                del self._order[index]
+                if any(self._queues[call_id]):
+                    self._order.append(call_id)
+                else:
+                    del self._queues[call_id]
+                return job
+        return None
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.future.done():
+                continue
+
+            self._running += 1
+            self._company_running[job.company_id] = self._company_running.get(job.company_id, 0) + 1
+            self._waits[job.speaker if job.speaker in self._waits else SPEAKER_PRIORITY[-1]].append(
+                time.monotonic() - job.enqueued_at
+            )
+            task = asyncio.get_running_loop().create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job):
+        try:
+            text = await self.transcribe(job.audio)
+            self.completed += 1
+            if not job.future.done():
+                job.future.set_result(text)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"STT request failed for {job.call_id}/{job.speaker}: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running -= 1
+            self._company_running[job.company_id] -= 1
+            if not self._company_running[job.company_id]:
+                del self._company_running[job.company_id]
+            self._dispatch()
+
+    def reserve_streams(
+        self,
+        call_id: str,
+        count: int,
+        company_id: Optional[int] = None,
+        company_limit: Optional[int] = None
+    ) -> bool:
+        """Резервирует потоковые сессии звонка; False — лимит исчерпан, звонок идет через чанки"""
+        limit = company_limit or self.company_stream_limit
+        total = sum(n for _, n in self._streams.values())
+        if total + count > self.max_streams or self._company_streams.get(company_id, 0) + count > limit:
+            self.rejected_streams += 1
+            return False
+        self._streams[call_id] = (company_id, count)
+        self._company_streams[company_id] = self._company_streams.get(company_id, 0) + count
+        return True
+
+    def release_streams(self, call_id: str):
+        reserved = self._streams.pop(call_id, None)
+        if reserved is None:
+            return
+        company_id, count = reserved
+        self._company_streams[company_id] -= count
+        if not self._company_streams[company_id]:
+            del self._company_streams[company_id]
+
+    def get_stats(self) -> dict:
+        """Загрузка и время ожидания в очереди (мс)"""
+        waits = {}
+        for speaker, samples in self._waits.items():
+            values = list(samples)
+            waits[speaker] = {
+                "p50_ms": round(_percentile(values, 0.5) * 1000, 1),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                "max_ms": round(max(values, default=0.0) * 1000, 1),
+            }
+        return {
+            "running": self._running,
+            "queued": sum(len(jobs) for queues in self._queues.values() for jobs in queues),
+            "queued_calls": len(self._order),
+            "max_concurrent": self.max_concurrent,
+            "streams": sum(n for _, n in self._streams.values()),
+            "max_streams": self.max_streams,
+            "rejected_streams": self.rejected_streams,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_wait": waits,
+        }
+
+
+# Глобальный экземпляр
+stt_scheduler = STTScheduler(
+    transcription_service.transcribe_chunk,
+    max_concurrent=settings.stt_max_concurrent,
+    company_limit=settings.stt_company_max_concurrent,
+    max_streams=settings.stt_max_streams,
+    company_stream_limit=settings.stt_company_max_streams
+)
@@ -0,0 +1,150 @@
+"""Кэш подсказок LLM по компании, нормализованной реплике и стадии разговора"""
+import math
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..config import get_settings
+from ..schemas.events import TranscriptSegment
+from .objection_rules import normalize
+
+settings = get_settings()
+
+# Границы стадий разговора по числу реплик в истории
+STAGES = (3, 10, 30)
+
+MISS = object()  # get(): записи нет (None — закэширован ответ "подсказка не нужна")
+
+
+class _Entry(NamedTuple):
+    expires: float
+    value: Optional[dict]  # поля подсказки или None — подсказка не нужна
+    bucket: Tuple[str, str]
+    vector: Optional[Dict[str, float]]
+
+
+def context_signature(new_segments: List[TranscriptSegment], history_length: int) -> str:
+    """Говорящие новых реплик и стадия разговора"""
+    speakers = "+".join(dict.fromkeys(segment.speaker for segment in new_segments))
+    stage = sum(history_length >= bound for bound in STAGES)
+    return f"{speakers}:{stage}"
+
+
+def _trigrams(text: str) -> Dict[str, float]:
+    padded = f" {text} "
+    counts = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {gram: count / norm for gram, count in counts.items()}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+class SuggestionCache:
+    """TTL + LRU кэш в памяти процесса"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0, similarity: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        # (компания, сигнатура) → ключи: кандидаты для поиска по похожести
+        self._buckets: Dict[Tuple[str, str], set] = {}
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def make_key(
+        company_id: Optional[int], new_segments: List[TranscriptSegment], history_length: int
+    ) -> Tuple[str, str, str]:
+        utterance = normalize(" ".join(segment.text for segment in new_segments))
+        return str(company_id), context_signature(new_segments, history_length), utterance
+
+    def get(self, key: Tuple[str, str, str]):
+        """Поля подсказки, None (подсказка не нужна) или MISS"""
+        now = time.monotonic()
+        entry = self._lookup(key, now)
+        if entry is None and self.similarity > 0 and key[2]:
+            entry = self._nearest(key, now)
+            if entry is not None:
+                self.similar_hits += 1
+        if entry is None:
+            self.misses += 1
+            return MISS
+        self.hits += 1
+        return entry.value
+
+    def _lookup(self, key, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            self._drop(key)
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, key, now: float) -> Optional[_Entry]:
+        vector = _trigrams(key[2])
+        best, best_score = None, self.similarity
+        for candidate in list(self._buckets.get(key[:2], ())):
+            entry = self._entries[candidate]
+            if entry.expires <= now:
+                self._drop(candidate)
+                self.expired += 1
+                continue
+            score = _cosine(vector, entry.vector)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return self._lookup(best, now) if best is not None else None
+
+    def put(self, key: Tuple[str, str, str], value: Optional[dict]):
+        if not key[2]:
+            return
+        self._drop(key)
+        bucket = key[:2]
+        vector = _trigrams(key[2]) if self.similarity > 0 else None
+        self._entries[key] = _Entry(time.monotonic() + self.ttl, value, bucket, vector)
+        self._buckets.setdefault(bucket, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._buckets.get(entry.bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._buckets[entry.bucket]
+
+    def get_stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else None,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+
+# Глобальный экземпляр
+suggestion_cache = SuggestionCache(
+    max_entries=settings.suggestion_cache_max_entries,
+    ttl=settings.suggestion_cache_ttl_seconds,
+    similarity=settings.suggestion_cache_similarity
+) if settings.suggestion_cache_enabled else None
@@ -0,0 +1,146 @@
+"""Инкрементальный разбор JSON подсказки из потока токенов LLM"""
+import json
+import re
+from typing import List, Optional, Tuple
+
+# События разбора
+FIELD = "field"  # строковое поле разобрано целиком: (FIELD, ключ, значение)
+DELTA = "delta"  # очередной кусок строкового значения: (DELTA, ключ, текст)
+
+_HEX = set("0123456789abcdefABCDEF")
+_FENCE = re.compile(r"^\s*```[\w-]*\s*|\s*```\s*$")
+
+
+class SuggestionStreamParser:
+    """
+    Инкрементальный разбор плоского JSON: куски строк (DELTA) и поля целиком (FIELD).
+    Ответ "null" виден по is_null; обрамление ```json пропускается
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.is_null = False
+        self._state = "start"
+        self._lead = ""  # первое слово ответа до "{": проверка на null
+        self._key = ""
+        self._value: List[str] = []
+        self._escape = ""
+        self._depth = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, str]]:
+        self.text += chunk
+        events: List[Tuple[str, str, str]] = []
+        delta: List[str] = []
+        for char in chunk:
+            state = self._state
+            if state == "start":
+                if char == "{":
+                    self._state = "key"
+                elif char == "`" and not self._lead:
+                    self._state = "fence"
+                elif not char.isspace() and self._lead is not None:
+                    self._lead += char
+                    if self._lead == "null":
+                        self.is_null = True
+                        self._state = "done"
+                    elif not "null".startswith(self._lead):
+                        self._lead = None  # перед объектом другой текст: null не ищем
+            elif state == "fence":
+                # ```json до конца строки
+                if char == "\n":
+                    self._state = "start"
+                elif char == "{":
+                    self._state = "key"
+            elif state == "key":
+                if char == '"':
+                    self._key = ""
+                    self._state = "key_string"
+                elif char == "}":
+                    self._state = "done"
+            elif state == "key_string":
+                if char == '"':
+                    self._state = "colon"
+                else:
+                    self._key += char
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value"
+            elif state == "value":
+                if char == '"':
+                    self._value = []
+                    self._state = "string"
+                elif char in "{[":
+                    self._depth = 1
+                    self._state = "nested"
+                elif not char.isspace():
+                    self._state = "scalar"
+            elif state == "string":
+                if self._escape:
+                    self._escape += char
+                    decoded = self._decode_escape()
+                    if decoded is not None:
+                        delta.append(decoded)
+                elif char == "\\":
+                    self._escape = char
+                elif char == '"':
+                    self._flush(delta, events)
+                    events.append((FIELD, self._key, "".join(self._value)))
+                    self._state = "next"
+                else:
+                    delta.append(char)
+            elif state == "nested":
+                # Строки внутри вложенных значений не разбираются: скобки в них редки
+                if char in "{[":
+                    self._depth += 1
+                elif char in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._state = "next"
+            elif state in ("scalar", "next"):
+                if char == ",":
+                    self._state = "key"
+                elif char == "}":
+                    self._state = "done"
+        if self._state == "string":
+            self._flush(delta, events)
+        return events
+
+    def _flush(self, delta: List[str], events: List[Tuple[str, str, str]]):
+        if delta:
+            text = "".join(delta)
+            self._value.append(text)
+            events.append((DELTA, self._key, text))
+            delta.clear()
+
+    def _decode_escape(self) -> Optional[str]:
+        """Декодирует накопленную escape-последовательность, если она полная"""
+        escape = self._escape
+        if escape[1] != "u":
+            self._escape = ""
+            try:
+                return json.loads(f'"{escape}"')
+            except ValueError:
+                return escape[1]
+        if len(escape) < 6:
+            return None
+        code = int(escape[2:6], 16) if set(escape[2:6]) <= _HEX else 0
+        if 0xD800 <= code < 0xDC00 and len(escape) < 12:
+            # Старшая половина суррогатной пары: ждем \\uXXXX младшей
+            if (len(escape) >= 7 and escape[6] != "\\") or (len(escape) >= 8 and escape[7] != "u"):
+                self._escape = ""
+                return json.loads(f'"{escape[:6]}"', strict=False) + escape[6:]
+            return None
+        self._escape = ""
+        try:
+            return json.loads(f'"{escape}"')
+        except ValueError:
+            return escape
+
+    @property
+    def payload(self) -> str:
+        """Полный текст ответа без обрамления ```json ... ```"""
+        return _FENCE.sub("", self.text)
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
@@ -0,0 +1,155 @@
+"""Очередь подсказок звонка: склейка сегментов и отмена устаревших запросов"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+from ..schemas.events import Suggestion, SuggestionDelta, TranscriptSegment
+from .ai_agent import ai_agent
+
+
+class SuggestionWorker:
+    """
+    Один запрос подсказки на звонок: склейка реплик по debounce, отмена устаревшего запроса.
+    Отмена ограничена: реплика клиента, supersede_window, max_superseded, еще не начатый ответ
+    """
+
+    def __init__(
+        self,
+        call_id: str,
+        on_suggestion: Callable[[Suggestion], Awaitable[None]],
+        on_delta: Callable[[SuggestionDelta], Awaitable[None]],
+        debounce: float = 0.3,
+        max_delay: float = 1.5,
+        company_id: Optional[int] = None,
+        supersede_window: float = 1.5,
+        max_superseded: int = 2
+    ):
+        self.call_id = call_id
+        self.company_id = company_id
+        self.on_suggestion = on_suggestion
+        self.on_delta = on_delta
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.supersede_window = supersede_window
+        self.max_superseded = max_superseded
+
+        self._pending: List[TranscriptSegment] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._inflight_started = 0.0
+        self._streaming = False  # предварительная подсказка уже на экране
+        self._superseded_in_row = 0
+
+        self.requests = 0
+        self.superseded = 0
+        self.merged_segments = 0
+        self.suggestions = 0
+
+    def submit(self, segment: TranscriptSegment, analyze: bool = True):
+        """
+        Добавляет сегмент; запрос в полете может быть отменен (_should_supersede).
+        analyze=False — только в историю (подсказка уже дана правилами)
+        """
+        ai_agent.add_transcript(segment)
+        if not analyze:
+            return
+        self._pending.append(segment)
+        if self._should_supersede(segment):
+            self._inflight.cancel()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _should_supersede(self, segment: TranscriptSegment) -> bool:
+        if self._inflight is None or self._inflight.done():
+            return False
+        if segment.speaker != "client" or self._streaming:
+            return False
+        if self._superseded_in_row >= self.max_superseded:
+            return False
+        age = asyncio.get_running_loop().time() - self._inflight_started
+        return age < self.supersede_window
+
+    async def _settle(self):
+        """Ждет паузу в сегментах debounce, но не дольше max_delay"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while True:
+            self._wakeup.clear()
+            timeout = min(self.debounce, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await self._settle()
+            batch, self._pending = self._pending, []
+            if not batch:
+                continue
+
+            self.requests += 1
+            self.merged_segments += len(batch) - 1
+            shown: List[str] = []  # предварительные подсказки на экране оператора
+
+            async def on_provisional(suggestion: Suggestion):
+                self._streaming = True
+                shown.append(suggestion.suggestion_id)
+                await self.on_suggestion(suggestion)
+
+            async def on_delta(suggestion_id: str, text: str):
+                await self.on_delta(SuggestionDelta(call_id=self.call_id, suggestion_id=suggestion_id, delta=text))
+
+            loop = asyncio.get_running_loop()
+            self._streaming = False
+            self._inflight_started = loop.time()
+            self._inflight = loop.create_task(
+                ai_agent.suggest(self.call_id, batch, self.company_id, on_provisional, on_delta)
+            )
+            # wait не пробрасывает отмену: отменен ли сам запрос, видно по задаче
+            await asyncio.wait((self._inflight,))
+            if self._inflight.cancelled():
+                self.superseded += 1
+                self._superseded_in_row += 1
+                self._pending[:0] = batch
+                await self._retract(shown)
+                continue
+            self._superseded_in_row = 0
+
+            try:
+                # Реплики, пришедшие во время запроса, уйдут следующим запросом
+                suggestion = self._inflight.result()
+                if suggestion is not None:
+                    self.suggestions += 1
+                    await self.on_suggestion(suggestion)
+                else:
+                    await self._retract(shown)
+            except Exception as e:
+                logger.error(f"Suggestion error for {self.call_id}: {e}")
+
+    async def _retract(self, suggestion_ids: List[str]):
+        """Убирает с экрана предварительные подсказки без итога"""
+        for suggestion_id in suggestion_ids:
+            await self.on_delta(SuggestionDelta(call_id=self.call_id, suggestion_id=suggestion_id, cancelled=True))
+
+    async def close(self):
+        for task in (self._task, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+        tasks = [task for task in (self._task, self._inflight) if task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "superseded": self.superseded,
+            "merged_segments": self.merged_segments,
+            "suggestions": self.suggestions,
+            "pending": len(self._pending),
+        }
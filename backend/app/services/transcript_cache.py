@@ -0,0 +1,164 @@
+"""Дисковый кэш результатов транскрипции по sha256 аудио"""
+import hashlib
+import json
+import os
+import threading
+import wave
+from collections import OrderedDict
+from typing import Any, Optional
+
+from loguru import logger
+
+from ..config import get_settings
+
+settings = get_settings()
+
+READ_CHUNK = 1 << 20
+
+
+def pcm_key(kind: str, audio: bytes, sample_rate: int) -> str:
+    """Ключ для 16-bit mono PCM"""
+    digest = hashlib.sha256(f"{kind}:{settings.soniox_model}:pcm:{sample_rate}:".encode())
+    digest.update(audio)
+    return digest.hexdigest()
+
+
+def file_key(kind: str, path: str) -> str:
+    """Ключ аудиофайла; у WAV хэшируются только формат и сэмплы"""
+    digest = hashlib.sha256(f"{kind}:{settings.soniox_model}:".encode())
+    try:
+        with wave.open(path, "rb") as wav:
+            digest.update(f"wav:{wav.getnchannels()}:{wav.getsampwidth()}:{wav.getframerate()}:".encode())
+            frames_per_chunk = max(1, READ_CHUNK // (wav.getnchannels() * wav.getsampwidth()))
+            while True:
+                frames = wav.readframes(frames_per_chunk)
+                if not frames:
+                    break
+                digest.update(frames)
+        return digest.hexdigest()
+    except (wave.Error, EOFError):
+        pass
+
+    digest = hashlib.sha256(f"{kind}:{settings.soniox_model}:raw:".encode())
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """Дисковый LRU кэш {path}/{key[:2]}/{key}.json; методы блокирующие, вызываются через to_thread"""
+
+    def __init__(self, path: str = settings.transcript_cache_path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key → размер, от давних к свежим
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if os.path.isdir(self.path):
+            for directory, _, names in os.walk(self.path):
+                for name in names:
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(directory, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._size += size
+        if entries:
+            logger.info(f"Transcript cache: {len(entries)} entries, {self._size / 1024 / 1024:.1f} MB")
+        self._evict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            self._load()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._file(key)
+            try:
+                with open(path) as f:
+                    value = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Transcript cache entry {key} is unreadable: {e}")
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value, ensure_ascii=False).encode()
+        with self._lock:
+            self._load()
+            path = self._file(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                self.errors += 1
+                logger.error(f"Transcript cache write error: {e}")
+                return
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _drop(self, key: str):
+        self._size -= self._index.pop(key, 0)
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Transcript cache remove error: {e}")
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            self._drop(next(iter(self._index)))
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "size_mb": round(self._size / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else None,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+# Глобальный экземпляр
+transcript_cache = TranscriptCache(
+    max_bytes=settings.transcript_cache_max_mb * 1024 * 1024
+) if settings.transcript_cache_enabled else None
@@ -1,48 +1,139 @@
 """Сервис транскрипции аудио через Soniox"""
 import asyncio
-import os
-from typing import AsyncGenerator, Optional
-from soniox.speech_service import SpeechClient
-from soniox.transcribe_file import transcribe_file_short
+import queue
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, NamedTuple, Optional, Union
+import numpy as np
+from soniox.transcribe_file import transcribe_bytes_short, transcribe_file_short, transcribe_file_stream
+from soniox.transcribe_live import transcribe_stream
 from loguru import logger
 from ..config import get_settings
+from .audio_buffer import AudioMemoryBudget
+from .soniox_pool import SonioxClientPool, is_channel_error, soniox_pool
+from .transcript_cache import TranscriptCache, file_key, pcm_key, transcript_cache
 
 settings = get_settings()
 
+# 16-bit mono PCM: bytes, memoryview (например, из AudioRingBuffer) или int16 массив
+PCMData = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+class Word(NamedTuple):
+    """Слово записи с меткой времени (формат кэша, совместим со словами Soniox)"""
+    text: str
+    start_ms: int
+    duration_ms: int
+
+
+class TranscriptDelta(NamedTuple):
+    """
+    Изменение сегмента потоковой транскрипции относительно предыдущей версии.
+    Промежуточная версия: первые keep токенов остаются, tokens дописываются после них.
+    Финальная (is_final) заменяет все промежуточные версии сегмента целиком
+    """
+    segment_id: str
+    keep: int
+    tokens: List[str]
+    is_final: bool
+    op: str = "replace"  # append — предыдущая версия сохранена целиком
+    
+    @property
+    def text(self) -> str:
+        return ' '.join(self.tokens)
+
+
+# on_segment(speaker, delta) для результатов потоковой транскрипции
+SegmentCallback = Callable[[str, TranscriptDelta], Awaitable[None]]
+
+# Токен Soniox, которым endpoint detection отмечает конец фразы
+STREAM_END_TOKEN = "<end>"
+
+
+def _result_text(result) -> str:
+    """Склеивает слова результата Soniox"""
+    if result and hasattr(result, 'words'):
+        return ' '.join([word.text for word in result.words])
+    return ""
+
 
 class TranscriptionService:
     """Сервис для транскрипции аудио через Soniox API"""
     
-    def __init__(self):
-        self.client = SpeechClient(api_key=settings.soniox_api_key)
+    def __init__(self, pool: SonioxClientPool = soniox_pool, cache: Optional[TranscriptCache] = transcript_cache):
+        self.pool = pool
+        self.cache = cache
+        
+    async def _cached(self, key: Optional[str]):
+        if self.cache is None or key is None:
+            return None
+        return await asyncio.to_thread(self.cache.get, key)
+    
+    async def _store(self, key: Optional[str], value):
+        if self.cache is not None and key is not None:
+            await asyncio.to_thread(self.cache.put, key, value)
+    
+    async def _file_key(self, kind: str, audio_path: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return await asyncio.to_thread(file_key, kind, audio_path)
         
-    async def transcribe_file(self, audio_path: str) -> str:
-        """Транскрибирует аудиофайл"""
+    async def transcribe_file(self, audio_path: str, prepared: bool = False) -> str:
+        """
+        Транскрибирует аудиофайл.
+        prepared=True — файл уже WAV 16-bit mono с частотой soniox_sample_rate
+        """
         try:
             # Soniox требует определенный формат аудио
             # Конвертируем если нужно
-            audio_path_converted = await self._prepare_audio(audio_path)
+            audio_path_converted = audio_path if prepared else await self._prepare_audio(audio_path)
             
-            # Транскрибируем через Soniox
-            result = await asyncio.to_thread(
-                transcribe_file_short,
-                audio_path_converted,
-                settings.soniox_api_key,
-                model=settings.soniox_model,
-                sample_rate_hertz=settings.soniox_sample_rate
-            )
+            # Ключ считается по уже подготовленному аудио
+            key = await self._file_key("text", audio_path_converted)
+            cached = await self._cached(key)
+            if cached is not None:
+                return cached
             
-            # Извлекаем текст из результата
-            if result and hasattr(result, 'words'):
-                text = ' '.join([word.text for word in result.words])
-                return text
+            # Транскрибируем через Soniox
+            with self.pool.client() as client:
+                result = await asyncio.to_thread(
+                    transcribe_file_short,
+                    audio_path_converted,
+                    client,
+                    model=settings.soniox_model,
+                    sample_rate_hertz=settings.soniox_sample_rate
+                )
             
-            return ""
+            text = _result_text(result)
+            await self._store(key, text)
+            return text
             
         except Exception as e:
             logger.error(f"Soniox transcription error: {e}")
             return ""
     
+    async def transcribe_recording(self, audio_path: str) -> List[Word]:
+        """
+        Транскрибирует запись целиком через потоковый API (у short API предел длины).
+        Возвращает слова с метками времени. Формат WAV определяется по заголовку;
+        ошибки пробрасываются вызывающему
+        """
+        key = await self._file_key("words", audio_path)
+        cached = await self._cached(key)
+        if cached is not None:
+            return [Word(*word) for word in cached]
+        
+        with self.pool.client() as client:
+            result = await asyncio.to_thread(
+                transcribe_file_stream,
+                audio_path,
+                client,
+                model=settings.soniox_model
+            )
+        words = [Word(w.text, w.start_ms, w.duration_ms) for w in result.words] if result else []
+        await self._store(key, [list(word) for word in words])
+        return words
+    
     async def _prepare_audio(self, audio_path: str) -> str:
         """
         Подготавливает аудио для Soniox
@@ -69,77 +160,299 @@ class TranscriptionService:
             logger.warning(f"Audio preparation error: {e}, using original file")
             return audio_path
     
-    async def transcribe_chunk(self, audio_data: bytes, format: str = "wav") -> str:
-        """Транскрибирует аудио-чанк"""
-        import tempfile
-        
+    async def transcribe_pcm(self, audio_data: PCMData, sample_rate: Optional[int] = None) -> str:
+        """
+        Транскрибирует PCM из памяти, без временных файлов и перекодирования.
+        Формат передается в Soniox явно: pcm_s16le, mono, sample_rate
+        """
         try:
-            # Сохраняем во временный файл
-            with tempfile.NamedTemporaryFile(suffix=f".{format}", delete=False) as f:
-                f.write(audio_data)
-                temp_path = f.name
+            if isinstance(audio_data, np.ndarray):
+                audio_data = audio_data.astype("<i2", copy=False)
+            # Копия обязательна: view кольцевого буфера может быть перезаписан,
+            # пока запрос выполняется в потоке
+            audio = bytes(memoryview(audio_data).cast("B"))
+            sample_rate = sample_rate or settings.soniox_sample_rate
+            
+            # Повторяющиеся фразы (IVR, сообщения ожидания) приходят байт в байт;
+            # по умолчанию живые чанки не кэшируются (transcript_cache_pcm)
+            key = (
+                pcm_key("text", audio, sample_rate)
+                if self.cache is not None and settings.transcript_cache_pcm else None
+            )
+            cached = await self._cached(key)
+            if cached is not None:
+                return cached
             
-            result = await self.transcribe_file(temp_path)
+            with self.pool.client() as client:
+                result = await asyncio.to_thread(
+                    transcribe_bytes_short,
+                    audio,
+                    client,
+                    model=settings.soniox_model,
+                    audio_format="pcm_s16le",
+                    sample_rate_hertz=sample_rate,
+                    num_audio_channels=1
+                )
             
-            # Удаляем временный файл
-            os.unlink(temp_path)
-            if os.path.exists(temp_path.replace('.wav', '_soniox.wav')):
-                os.unlink(temp_path.replace('.wav', '_soniox.wav'))
+            text = _result_text(result)
+            await self._store(key, text)
+            return text
             
-            return result
         except Exception as e:
-            logger.error(f"Chunk transcription error: {e}")
+            logger.error(f"Soniox transcription error: {e}")
             return ""
+    
+    async def transcribe_chunk(self, audio_data: PCMData) -> str:
+        """
+        Транскрибирует аудио-чанк: 16-bit mono PCM с частотой soniox_sample_rate
+        (ресемплинг выполняется в AudioPipeline)
+        """
+        return await self.transcribe_pcm(audio_data)
 
 
-class RealtimeTranscriptionService:
-    """Сервис real-time транскрипции через Soniox Streaming API"""
+class StreamingSession:
+    """
+    Долгоживущий поток Soniox одной стороны звонка (gRPC в отдельном потоке).
+    Фраза — сегмент со стабильным id: сначала изменения хвоста, в конце финальный текст
+    """
     
-    def __init__(self):
-        self.api_key = settings.soniox_api_key
-        self.client = SpeechClient(api_key=self.api_key)
+    def __init__(
+        self,
+        call_id: str,
+        speaker: str,
+        pool: SonioxClientPool,
+        on_segment: SegmentCallback,
+        sample_rate: int = settings.soniox_sample_rate,
+        queue_size: int = 500,
+        budget: Optional[AudioMemoryBudget] = None
+    ):
+        self.call_id = call_id
+        self.speaker = speaker
+        self.pool = pool
+        self.on_segment = on_segment
+        self.sample_rate = sample_rate
+        self._audio: queue.Queue = queue.Queue(maxsize=queue_size)
+        # Аудио в очереди учитывается в общем бюджете памяти, пока его не забрал стрим
+        self.budget = budget
+        self._results: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._deliver_task: Optional[asyncio.Task] = None
+        self._closed = threading.Event()
         
-    async def stream_transcribe(
-        self, 
-        audio_stream: AsyncGenerator[bytes, None]
-    ) -> AsyncGenerator[str, None]:
-        """
-        Потоковая транскрипция аудио через Soniox
-        """
-        from soniox.speech_service import RecognizeRequest, RecognitionConfig
+        # Состояние текущей фразы (используется только в потоке стрима)
+        self._final_words: List[str] = []
+        self._sent_tokens: List[str] = []  # последняя отправленная версия сегмента
+        self._segment_seq = 0
+        
+        self.dropped_chunks = 0
+        self.restarts = 0  # после ошибок
+        self.reopens = 0  # после штатного закрытия сервером
         
+    def start(self):
+        """Открывает поток (вызывается из event loop)"""
+        self._loop = asyncio.get_running_loop()
+        self._results = asyncio.Queue()
+        self._deliver_task = self._loop.create_task(self._deliver())
+        self._thread = threading.Thread(
+            target=self._run, name=f"stt-{self.call_id}-{self.speaker}", daemon=True
+        )
+        self._thread.start()
+        
+    def feed(self, audio_data: PCMData):
+        """Передает PCM в поток; при переполнении очереди или бюджета памяти чанк отбрасывается"""
+        if self._closed.is_set() or not len(audio_data):
+            return
+        if isinstance(audio_data, np.ndarray):
+            audio_data = audio_data.astype("<i2", copy=False)
+        chunk = bytes(memoryview(audio_data).cast("B"))
+        if self.budget is not None and not self.budget.try_reserve(len(chunk)):
+            self.dropped_chunks += 1
+            return
         try:
-            # Настройки распознавания
-            config = RecognitionConfig(
-                model=settings.soniox_model,
-                sample_rate_hertz=settings.soniox_sample_rate,
-                enable_interim_results=True,
-                enable_punctuation=True,
-            )
+            self._audio.put_nowait(chunk)
+        except queue.Full:
+            self._release(chunk)
+            self.dropped_chunks += 1
             
-            # Создаем streaming запрос
-            async def audio_generator():
-                """Генератор аудио чанков"""
-                async for chunk in audio_stream:
-                    yield RecognizeRequest(audio_content=chunk)
+    def _release(self, chunk: Optional[bytes]):
+        """Чанк покинул очередь: память возвращается в бюджет"""
+        if chunk is not None and self.budget is not None:
+            self.budget.release(len(chunk))
             
-            # Запускаем распознавание
-            responses = self.client.transcribe_stream(
-                audio_generator(),
-                config
-            )
+    def feed_silence(self, milliseconds: int):
+        """Тишина после конца речи, чтобы endpoint detection Soniox закрыл фразу"""
+        self.feed(bytes(self.sample_rate * milliseconds // 1000 * 2))
+        
+    def _iter_audio(self) -> Iterable[bytes]:
+        while True:
+            chunk = self._audio.get()
+            if chunk is None:
+                return
+            self._release(chunk)
+            yield chunk
             
-            # Возвращаем результаты
-            for response in responses:
-                if response.results:
-                    for result in response.results:
-                        if result.alternatives:
-                            transcript = result.alternatives[0].transcript
-                            if transcript.strip():
-                                yield transcript
-                                
-        except Exception as e:
-            logger.error(f"Soniox streaming error: {e}")
+    def _run(self):
+        """
+        Итерация gRPC стрима. Стрим переоткрывается на канале из пула и при
+        обрыве, и при штатном закрытии сервером (предел длины, простой):
+        выходим только после close()
+        """
+        while not self._closed.is_set():
+            client = self.pool.acquire()
+            opened = time.monotonic()
+            failed = False
+            try:
+                for result in transcribe_stream(
+                    self._iter_audio(),
+                    client,
+                    model=settings.soniox_model,
+                    audio_format="pcm_s16le",
+                    sample_rate_hertz=self.sample_rate,
+                    num_audio_channels=1,
+                    include_nonfinal=True,
+                    enable_endpoint_detection=True
+                ):
+                    self._on_result(result)
+                if self._closed.is_set():
+                    break
+                self.reopens += 1
+                logger.info(f"Soniox stream for {self.call_id}/{self.speaker} closed by server, reopening")
+                self._restart_phrase()
+                if time.monotonic() - opened < 1.0:
+                    # Сервер сразу закрывает стрим: не переоткрываем в цикле без паузы
+                    time.sleep(1.0)
+            except Exception as e:
+                if self._closed.is_set():
+                    break
+                self.restarts += 1
+                failed = is_channel_error(e)
+                logger.error(f"Soniox stream error for {self.call_id}/{self.speaker}: {e}")
+                self._restart_phrase()
+                time.sleep(min(self.restarts, 5))
+            finally:
+                self.pool.release(client, failed)
+                
+        self._finish_phrase()
+        self._loop.call_soon_threadsafe(self._results.put_nowait, None)
+        
+    def _restart_phrase(self):
+        """Новый стрим — новый сегмент: фраза старого стрима закрывается тем, что успело прийти"""
+        seq = self._segment_seq
+        self._finish_phrase()
+        if self._segment_seq == seq:
+            self._segment_seq += 1
+        
+    def _on_result(self, result):
+        """
+        Финальные слова приходят один раз и копятся до токена <end>;
+        нефинальные — текущая гипотеза хвоста, каждый раз целиком
+        """
+        interim: List[str] = []
+        for word in result.words:
+            if word.text == STREAM_END_TOKEN:
+                self._finish_phrase()
+            elif word.is_final:
+                self._final_words.append(word.text)
+            else:
+                interim.append(word.text)
+                
+        self._post_partial(self._final_words + interim)
+        
+    @property
+    def _segment_id(self) -> str:
+        return f"{self.call_id}:{self.speaker}:{self._segment_seq}"
+        
+    def _post_partial(self, tokens: List[str]):
+        """Отправляет только отличие от предыдущей версии сегмента"""
+        keep = 0
+        for sent, token in zip(self._sent_tokens, tokens):
+            if sent != token:
+                break
+            keep += 1
+        if keep == len(self._sent_tokens) == len(tokens):
+            return
+        op = "append" if keep == len(self._sent_tokens) else "replace"
+        self._sent_tokens = list(tokens)
+        self._post(TranscriptDelta(self._segment_id, keep, tokens[keep:], False, op))
+            
+    def _finish_phrase(self):
+        if self._final_words:
+            self._post(TranscriptDelta(self._segment_id, 0, self._final_words, True))
+            self._segment_seq += 1
+        else:
+            # Гипотеза не подтвердилась: убираем промежуточный текст
+            self._post_partial([])
+        self._final_words = []
+        self._sent_tokens = []
+        
+    def _post(self, delta: TranscriptDelta):
+        self._loop.call_soon_threadsafe(self._results.put_nowait, delta)
+        
+    async def _deliver(self):
+        while True:
+            delta = await self._results.get()
+            if delta is None:
+                return
+            try:
+                await self.on_segment(self.speaker, delta)
+            except Exception as e:
+                logger.error(f"Streaming segment callback error for {self.call_id}/{self.speaker}: {e}")
+                
+    async def close(self, timeout: float = 5.0):
+        """Закрывает поток, дожидаясь последних финальных результатов"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        while True:
+            try:
+                self._audio.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self._release(self._audio.get_nowait())
+                except queue.Empty:
+                    pass
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, timeout)
+        # Стрим мог завершиться, не дочитав очередь
+        while True:
+            try:
+                self._release(self._audio.get_nowait())
+            except queue.Empty:
+                break
+        if self._deliver_task is not None:
+            try:
+                await asyncio.wait_for(self._deliver_task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Soniox stream {self.call_id}/{self.speaker} did not finish in {timeout}s")
+                
+    def get_stats(self) -> dict:
+        return {
+            "queued_chunks": self._audio.qsize(),
+            "dropped_chunks": self.dropped_chunks,
+            "restarts": self.restarts,
+            "reopens": self.reopens,
+        }
+
+
+class RealtimeTranscriptionService:
+    """Сервис real-time транскрипции через Soniox Streaming API"""
+    
+    def __init__(self, pool: SonioxClientPool = soniox_pool):
+        self.pool = pool
+        
+    def open_session(
+        self,
+        call_id: str,
+        speaker: str,
+        on_segment: SegmentCallback,
+        budget: Optional[AudioMemoryBudget] = None
+    ) -> StreamingSession:
+        """Открывает поток для стороны звонка"""
+        session = StreamingSession(call_id, speaker, self.pool, on_segment, budget=budget)
+        session.start()
+        return session
 
 
 # Глобальный экземпляр
@@ -0,0 +1,179 @@
+"""Детектор речи (VAD) для отсечения тишины перед STT"""
+import importlib
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Модель получает кадры (n_frames, frame_len) int16 и возвращает вероятность речи по кадрам
+VADModel = Callable[[np.ndarray], np.ndarray]
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+def load_vad_model(path: str, sample_rate: int) -> VADModel:
+    """
+    Загружает внешнюю модель по пути "package.module:factory".
+    factory(sample_rate) должна вернуть VADModel без состояния между потоками
+    """
+    module_name, _, attr = path.partition(":")
+    factory = getattr(importlib.import_module(module_name), attr)
+    return factory(sample_rate)
+
+
+class VoiceActivityDetector:
+    """
+    Покадровый VAD: энергия и ZCR, адаптивный уровень шума, гистерезис и hangover.
+    Уровень шума в речи тянется к минимуму энергии за noise_window_ms
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        energy_margin_db: float = 9.0,
+        min_energy_db: float = -55.0,
+        zcr_noise: float = 0.45,
+        start_frames: int = 3,
+        hangover_frames: int = 15,
+        model: Optional[VADModel] = None,
+        model_threshold: float = 0.5,
+        noise_window_ms: int = 5000,
+        noise_block_ms: int = 500,
+        noise_rise: float = 0.01
+    ):
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.energy_margin_db = energy_margin_db
+        self.min_energy_db = min_energy_db
+        self.zcr_noise = zcr_noise
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_frames
+        self.model = model
+        self.model_threshold = model_threshold
+
+        self.noise_db = min_energy_db
+        self.noise_rise = noise_rise
+        # Минимумы энергии по блокам noise_block_ms за последние noise_window_ms
+        self._block_frames = max(1, noise_block_ms // frame_ms)
+        self._block_min = float("inf")
+        self._block_count = 0
+        self._minima: deque = deque(maxlen=max(1, noise_window_ms // noise_block_ms))
+        self.in_speech = False
+        self._run = 0  # подряд идущие кадры, противоречащие текущему состоянию
+        self._remainder = np.empty(0, dtype=np.int16)
+
+    def process(self, pcm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Возвращает целые кадры (n_frames, frame_len) и флаг речи для каждого.
+        Неполный последний кадр переносится в следующий вызов
+        """
+        if len(self._remainder):
+            pcm = np.concatenate((self._remainder, pcm))
+        n_frames = len(pcm) // self.frame_len
+        self._remainder = pcm[n_frames * self.frame_len:].copy()
+        frames = pcm[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        if n_frames == 0:
+            return frames, np.zeros(0, dtype=bool)
+
+        x = frames.astype(np.float32)
+        energy_db = 10 * np.log10(np.mean(x * x, axis=1) / (32768.0 ** 2) + 1e-12)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+        raw = self._classify(frames, energy_db, zcr)
+        return frames, self._smooth(raw, energy_db)
+
+    def _classify(self, frames: np.ndarray, energy_db: np.ndarray, zcr: np.ndarray) -> np.ndarray:
+        threshold = max(self.noise_db + self.energy_margin_db, self.min_energy_db)
+        loud = energy_db > threshold
+        # Шумоподобные кадры (высокий ZCR) требуют запаса по энергии
+        raw = loud & ~((zcr > self.zcr_noise) & (energy_db < threshold + self.energy_margin_db))
+
+        if self.model is not None and loud.any():
+            probability = np.zeros(len(frames), dtype=np.float32)
+            probability[loud] = self.model(frames[loud])
+            raw = probability >= self.model_threshold
+        return raw
+
+    def _smooth(self, raw: np.ndarray, energy_db: np.ndarray) -> np.ndarray:
+        """Гистерезис состояния и адаптация уровня шума"""
+        flags = np.empty(len(raw), dtype=bool)
+        for i, is_speech in enumerate(raw):
+            if is_speech != self.in_speech:
+                self._run += 1
+                limit = self.start_frames if is_speech else self.hangover_frames
+                if self._run >= limit:
+                    self.in_speech = bool(is_speech)
+                    self._run = 0
+            else:
+                self._run = 0
+
+            level = float(energy_db[i])
+            self._block_min = min(self._block_min, level)
+            self._block_count += 1
+            if self._block_count == self._block_frames:
+                self._minima.append(self._block_min)
+                self._block_min = float("inf")
+                self._block_count = 0
+
+            if not is_speech:
+                # Быстро вниз, медленно вверх
+                if level < self.noise_db:
+                    self.noise_db = level
+                else:
+                    self.noise_db += 0.05 * (level - self.noise_db)
+            elif len(self._minima) == self._minima.maxlen:
+                # Речь без пауз дольше окна — это шум: уровень медленно поднимается
+                floor = min(self._minima)
+                if floor > self.noise_db:
+                    self.noise_db += self.noise_rise * (floor - self.noise_db)
+            flags[i] = self.in_speech
+        return flags
+
+
+class SpeechGate:
+    """
+    Пропускает в буфер только речь.
+    Перед началом речи добавляется pre-roll, чтобы не обрезать первый слог;
+    хвост после речи уже включен за счет hangover детектора
+    """
+
+    def __init__(self, detector: VoiceActivityDetector, preroll_frames: int = 15):
+        self.detector = detector
+        self.preroll: deque = deque(maxlen=preroll_frames)
+        self.speech_samples = 0
+        self.silence_samples = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self.detector.in_speech
+
+    def process(self, pcm: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+        """Возвращает PCM для буфера и события границ речи в порядке появления"""
+        was_speech = self.detector.in_speech
+        frames, flags = self.detector.process(pcm)
+        out: List[np.ndarray] = []
+        events: List[str] = []
+
+        bounds = np.flatnonzero(np.diff(flags)) + 1
+        for run in np.split(np.arange(len(flags)), bounds):
+            if len(run) == 0:
+                continue
+            chunk = frames[run[0]:run[-1] + 1]
+            if flags[run[0]]:
+                if not was_speech:
+                    events.append(SPEECH_START)
+                    out.extend(self.preroll)
+                    self.preroll.clear()
+                out.append(chunk.ravel())
+                self.speech_samples += chunk.size
+            else:
+                if was_speech:
+                    events.append(SPEECH_END)
+                self.preroll.extend(chunk[-self.preroll.maxlen:].copy())
+                self.silence_samples += chunk.size
+            was_speech = bool(flags[run[0]])
+
+        if not out:
+            return np.empty(0, dtype=np.int16), events
+        return np.concatenate(out), events
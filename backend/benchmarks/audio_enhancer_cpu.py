@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк CPU шумоподавления и АРУ в AudioPipeline.
+
+N потоков обрабатываются по очереди пачками payload, как в AudioStreamReceiver
+(по умолчанию G.711 μ-law 8 кГц → 16 кГц, пачка 100 мс). Для каждого варианта
+цепочки выводится CPU на поток (% одного ядра) и сколько потоков помещается
+в одно ядро:
+  baseline — декодирование и ресемплинг
+  ns       — + шумоподавление (спектральное вычитание)
+  agc      — + АРУ
+  ns+agc   — + оба
+
+Запуск из каталога backend:
+    python benchmarks/audio_enhancer_cpu.py --streams 50 --seconds 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.services.audio_codec import decode  # noqa: E402
+from app.services.audio_pipeline import AudioPipeline  # noqa: E402
+
+VARIANTS = {
+    "baseline": {},
+    "ns": {"noise_suppression": True},
+    "agc": {"agc": True},
+    "ns+agc": {"noise_suppression": True, "agc": True},
+}
+
+CODEC_RATES = {"ulaw": 8000, "alaw": 8000, "slin16": 16000}
+BYTES_PER_SAMPLE = {"ulaw": 1, "alaw": 1, "slin16": 2}
+
+
+def make_payload(media_format: str, seconds: float) -> bytes:
+    """Речеподобный сигнал (модулированный шум) с фоновым шумом линии"""
+    rate = CODEC_RATES[media_format]
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = (np.sin(2 * np.pi * 4 * t) > 0) * ((t % 3) < 2)
+    pcm = (rng.normal(0, 3000, len(t)) * envelope + rng.normal(0, 200, len(t))).astype(np.int16)
+    if BYTES_PER_SAMPLE[media_format] == 2:
+        return pcm.tobytes()
+    # G.711: ближайший код по таблице декодирования
+    table = decode(bytes(range(256)), media_format)
+    order = np.argsort(table)
+    index = np.clip(np.searchsorted(table[order], pcm), 0, 255)
+    return order[index].astype(np.uint8).tobytes()
+
+
+def run(name: str, options: dict, media_format: str, payload: bytes, streams: int, chunk_ms: int):
+    pipelines = [AudioPipeline(media_format, 16000, **options) for _ in range(streams)]
+    chunk = CODEC_RATES[media_format] * chunk_ms // 1000 * BYTES_PER_SAMPLE[media_format]
+    chunks = [payload[i:i + chunk] for i in range(0, len(payload) - chunk + 1, chunk)]
+
+    for pipeline in pipelines:
+        pipeline.process(chunks[0])  # прогрев
+    start = time.process_time()
+    for data in chunks:
+        for pipeline in pipelines:
+            pipeline.process(data)
+    cpu = time.process_time() - start
+
+    audio_seconds = len(chunks) * chunk_ms / 1000 * streams
+    per_stream = cpu / audio_seconds * 100
+    print(
+        f"{name:<9} cpu {cpu:7.2f} s   per stream {per_stream:6.3f}% core   "
+        f"streams/core {100 / per_stream:7.0f}"
+    )
+    return per_stream
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50, help="одновременных потоков")
+    parser.add_argument("--seconds", type=float, default=10.0, help="аудио на поток")
+    parser.add_argument("--chunk-ms", type=int, default=100, help="размер пачки payload")
+    parser.add_argument("--format", default="ulaw", choices=sorted(CODEC_RATES))
+    args = parser.parse_args()
+
+    payload = make_payload(args.format, args.seconds)
+    print(f"{args.streams} streams x {args.seconds:.0f}s {args.format}, chunks of {args.chunk_ms} ms")
+    baseline = None
+    for name, options in VARIANTS.items():
+        per_stream = run(name, options, args.format, payload, args.streams, args.chunk_ms)
+        if baseline is None:
+            baseline = per_stream
+        else:
+            print(f"{'':<9} overhead vs baseline {per_stream - baseline:+.3f}% core per stream")
+
+
+if __name__ == "__main__":
+    main()
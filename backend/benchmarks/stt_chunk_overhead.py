@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк локальных накладных расходов на чанк перед отправкой в Soniox.
+
+Сравниваются варианты подготовки одного чанка 16-bit PCM:
+  pydub    — временный WAV → pydub загрузка/экспорт во второй файл → чтение файла
+             (прежний путь transcribe_chunk → transcribe_file)
+  temp_wav — временный WAV без pydub → чтение файла (transcribe_file(prepared=True))
+  memory   — копия view кольцевого буфера в bytes (transcribe_pcm)
+
+Сетевой запрос не выполняется: измеряется только то, что происходит до него.
+
+Запуск из каталога backend:
+    python benchmarks/stt_chunk_overhead.py --seconds 3 --iterations 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def write_wav(pcm: memoryview) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        with wave.open(f, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(pcm)
+        return f.name
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def prepare_pydub(pcm: memoryview) -> bytes:
+    from pydub import AudioSegment
+
+    path = write_wav(pcm)
+    audio = AudioSegment.from_file(path)
+    audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    converted = path.replace(".wav", "_soniox.wav")
+    audio.export(converted, format="wav")
+    data = read_file(converted)
+    os.unlink(path)
+    os.unlink(converted)
+    return data
+
+
+def prepare_temp_wav(pcm: memoryview) -> bytes:
+    path = write_wav(pcm)
+    data = read_file(path)
+    os.unlink(path)
+    return data
+
+
+def prepare_memory(pcm: memoryview) -> bytes:
+    return bytes(pcm)
+
+
+def run(name, prepare, pcm: memoryview, iterations: int):
+    prepare(pcm)  # прогрев
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        prepare(pcm)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<10} mean {statistics.mean(timings):8.3f} ms   p50 {timings[len(timings) // 2]:8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3.0, help="длина чанка")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    samples = np.random.default_rng(0).integers(-8000, 8000, int(args.seconds * SAMPLE_RATE), dtype=np.int16)
+    pcm = memoryview(samples.tobytes())
+    print(f"Chunk: {args.seconds:.1f}s, {len(pcm)} bytes, {args.iterations} iterations")
+
+    try:
+        import pydub  # noqa: F401
+        run("pydub", prepare_pydub, pcm, args.iterations)
+    except ImportError:
+        print("pydub     skipped (pydub is not installed)")
+    run("temp_wav", prepare_temp_wav, pcm, args.iterations)
+    run("memory", prepare_memory, pcm, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -100,9 +100,20 @@ class AICallAgent {
             case 'transcript':
                 this.handleTranscript(event);
                 break;
+            case 'transcript_partial':
+                this.handleTranscriptPartial(event);
+                break;
             case 'suggestion':
                 this.handleSuggestion(event);
                 break;
+            case 'suggestion_delta':
+                this.handleSuggestionDelta(event);
+                break;
+            case 'on_hold':
+            case 'machine_detected':
+            case 'live_speech':
+                this.handleLineState(event);
+                break;
         }
     }
     
@@ -136,6 +147,16 @@ class AICallAgent {
         }
     }
     
+    handleLineState(event) {
+        const call = this.calls.get(event.call_id);
+        if (!call) return;
+        
+        // Музыка ожидания или автоответчик: подсказки по стороне приостановлены
+        call.line_states = call.line_states || {};
+        call.line_states[event.data.speaker] = event.event_type === 'live_speech' ? null : event.event_type;
+        this.renderCallsList();
+    }
+    
     handleCallEnd(event) {
         this.stopCallTimer(event.call_id);
         this.calls.delete(event.call_id);
@@ -150,6 +171,17 @@ class AICallAgent {
     handleTranscript(event) {
         const call = this.calls.get(event.call_id);
         if (call) {
+            // Финал заменяет промежуточный текст сегмента на том же месте
+            const partial = event.data.segment_id
+                ? call.transcripts.find(t => t.partial && t.segment_id === event.data.segment_id)
+                : null;
+            
+            if (partial) {
+                Object.assign(partial, event.data, { partial: false, tokens: null });
+                this.updateTranscriptMessage(call, partial);
+                return;
+            }
+            
             call.transcripts.push(event.data);
             
             if (this.activeCallId === event.call_id) {
@@ -158,22 +190,112 @@ class AICallAgent {
         }
     }
     
+    handleTranscriptPartial(event) {
+        const call = this.calls.get(event.call_id);
+        if (!call) return;
+        
+        const data = event.data;
+        let entry = call.transcripts.find(t => t.segment_id === data.segment_id);
+        if (entry && !entry.partial) return; // финал уже пришел
+        
+        if (!entry) {
+            entry = {
+                segment_id: data.segment_id,
+                speaker: data.speaker,
+                timestamp: data.timestamp,
+                tokens: [],
+                text: '',
+                partial: true
+            };
+            call.transcripts.push(entry);
+        }
+        
+        // append: keep == длине текущей версии; replace: хвост после keep заменяется
+        entry.tokens = entry.tokens.slice(0, data.keep).concat(data.tokens);
+        entry.text = entry.tokens.join(' ');
+        
+        if (entry.tokens.length === 0) {
+            // Гипотеза не подтвердилась
+            call.transcripts.splice(call.transcripts.indexOf(entry), 1);
+            if (this.activeCallId === event.call_id) {
+                this.renderTranscript(call);
+            }
+            return;
+        }
+        
+        this.updateTranscriptMessage(call, entry);
+    }
+    
+    updateTranscriptMessage(call, entry) {
+        if (this.activeCallId !== call.id) return;
+        
+        const container = this.elements.transcriptContent;
+        const message = container.querySelector(`[data-segment-id="${CSS.escape(entry.segment_id)}"]`);
+        if (!message) {
+            this.renderTranscript(call);
+            return;
+        }
+        
+        message.classList.toggle('partial', !!entry.partial);
+        message.querySelector('.message-text').textContent = entry.text;
+        container.scrollTop = container.scrollHeight;
+    }
+    
     handleSuggestion(event) {
         const call = this.calls.get(event.call_id);
         if (call) {
-            call.suggestions.unshift(event.data); // Add to beginning
+            // Итоговая подсказка заменяет предварительную с тем же suggestion_id
+            const index = event.data.suggestion_id
+                ? call.suggestions.findIndex(s => s.suggestion_id === event.data.suggestion_id)
+                : -1;
+            const isNew = index === -1;
+            if (isNew) {
+                call.suggestions.unshift(event.data); // Add to beginning
+            } else {
+                call.suggestions[index] = event.data;
+            }
             
             if (this.activeCallId === event.call_id) {
                 this.renderSuggestions(call);
             }
             
             // Highlight if high priority
-            if (event.data.priority === 'high') {
+            if (isNew && event.data.priority === 'high') {
                 this.highlightSuggestion();
             }
         }
     }
     
+    handleSuggestionDelta(event) {
+        const call = this.calls.get(event.call_id);
+        if (!call) return;
+        
+        const data = event.data;
+        const index = call.suggestions.findIndex(s => s.suggestion_id === data.suggestion_id);
+        if (index === -1) return;
+        
+        const suggestion = call.suggestions[index];
+        if (data.cancelled) {
+            call.suggestions.splice(index, 1);
+            if (this.activeCallId === event.call_id) {
+                this.renderSuggestions(call);
+            }
+            return;
+        }
+        if (!suggestion.provisional) return; // итог уже пришел
+        
+        suggestion.content += data.delta;
+        if (this.activeCallId === event.call_id) {
+            // Текст дописывается в карточку без перерисовки панели
+            const card = this.elements.suggestionsContent.querySelector(
+                `[data-suggestion-id="${CSS.escape(data.suggestion_id)}"] .suggestion-content`
+            );
+            if (card) {
+                card.textContent = suggestion.content;
+            }
+        }
+    }
+    
     // === UI Rendering ===
     renderCallsList() {
         const container = this.elements.callsList;
@@ -199,8 +321,16 @@ class AICallAgent {
             card.className = `call-card ${id === this.activeCallId ? 'active' : ''}`;
             card.onclick = () => this.selectCall(id);
             
-            const statusClass = call.status === 'answered' ? 'active' : 'ringing';
-            const statusText = call.status === 'answered' ? 'В разговоре' : 'Входящий';
+            const lineStates = Object.values(call.line_states || {});
+            let statusClass = call.status === 'answered' ? 'active' : 'ringing';
+            let statusText = call.status === 'answered' ? 'В разговоре' : 'Входящий';
+            if (lineStates.includes('machine_detected')) {
+                statusClass = 'suspended';
+                statusText = 'Автоответчик';
+            } else if (lineStates.includes('on_hold')) {
+                statusClass = 'suspended';
+                statusText = 'На удержании';
+            }
             
             card.innerHTML = `
                 <div class="call-card-avatar">
@@ -261,7 +391,10 @@ class AICallAgent {
         
         call.transcripts.forEach(transcript => {
             const message = document.createElement('div');
-            message.className = `message ${transcript.speaker}`;
+            message.className = `message ${transcript.speaker}${transcript.partial ? ' partial' : ''}`;
+            if (transcript.segment_id) {
+                message.dataset.segmentId = transcript.segment_id;
+            }
             
             const time = new Date(transcript.timestamp * 1000).toLocaleTimeString('ru-RU', {
                 hour: '2-digit',
@@ -310,7 +443,10 @@ class AICallAgent {
         
         call.suggestions.forEach(suggestion => {
             const card = document.createElement('div');
-            card.className = `suggestion-card ${suggestion.type} ${suggestion.priority}`;
+            card.className = `suggestion-card ${suggestion.type} ${suggestion.priority}${suggestion.provisional ? ' provisional' : ''}`;
+            if (suggestion.suggestion_id) {
+                card.dataset.suggestionId = suggestion.suggestion_id;
+            }
             
             const typeLabels = {
                 objection: '⚡ Возражение',